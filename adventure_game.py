@@ -1,22 +1,466 @@
 #!/usr/bin/python3
 
+import argparse
+import os
+import select
+import shutil
+import signal
 import sys
+import textwrap
+import threading
 import time
+from collections import namedtuple
+
+try:
+    import termios
+    import tty
+except ImportError:  # not a Unix terminal
+    termios = None
+
+from journal import Journal, Recording, first_difference
+from journal import load as load_journal
+from saves import SaveLog
+from story import DEFAULT_ENDING, END, load_story
+
+STORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'story.txt')
+
+
+class TextCache:
+    """A class keeping the narrative text wrapped to the width of the terminal
+    and encoded, so that every message is prepared once per width instead of
+    every time it is printed.
+
+    Attributes:
+    -------------
+    width : int
+        The width the text is wrapped to, 0 if it is not wrapped
+    encoding : str
+        The encoding of the prepared text
+    limit : int
+        The number of messages kept, the cache is emptied when it is full
+
+    Methods:
+    -------------
+    render(text, end)
+    invalidate()
+    follow_terminal()
+    """
+
+    def __init__(self, width=None, encoding='utf-8', limit=4096):
+        self._fixed_width = width
+        self.encoding = encoding
+        self.limit = limit
+        self._width = width
+        self._texts = {}
+
+    @property
+    def width(self):
+        if self._width is None:
+            self._width = shutil.get_terminal_size().columns
+        return self._width
+
+    def render(self, text, end=''):
+        """A method returning the message wrapped to the width and encoded,
+        followed by end."""
+        texts = self._texts  # a resize in the meantime replaces the dict
+        key = (text, end)
+        data = texts.get(key)
+        if data is None:
+            width = self.width
+            if width:
+                text = '\n'.join(textwrap.fill(line, width) if line else line
+                                 for line in text.split('\n'))
+            data = (text + end).encode(self.encoding, 'replace')
+            if len(texts) >= self.limit:
+                texts.clear()
+            texts[key] = data
+        return data
+
+    def invalidate(self):
+        """A method forgetting the prepared messages and the width of the
+        terminal."""
+        self._width = self._fixed_width
+        self._texts = {}
+
+    def follow_terminal(self):
+        """A method invalidating the cache whenever the terminal is resized
+        (on the systems signalling it)."""
+        if (hasattr(signal, 'SIGWINCH')
+                and threading.current_thread() is threading.main_thread()):
+            signal.signal(signal.SIGWINCH,
+                          lambda signal_number, frame: self.invalidate())
+
+
+text_cache = TextCache()  # shared by the sinks printing to the terminal
+
+
+class OutputSink:
+    """A parent class handling the way narrative text reaches the terminal.
+    Messages are prepared by a TextCache and written straight to the file
+    descriptor of the stream when it has one.
+
+    Attributes:
+    -------------
+    _stream : file
+        The stream the text is written to, sys.stdout by default
+    cache : TextCache
+        The cache preparing the messages, text_cache by default
+
+    Methods:
+    -------------
+    write(text, end)
+    echo(text)
+
+    Subclasses:
+    -------------
+    InstantSink
+    TypewriterSink
+    """
+
+    def __init__(self, stream=None, cache=None):
+        self._stream = stream
+        self.cache = cache or text_cache
+
+    @property
+    def stream(self):
+        return self._stream or sys.stdout
+
+    def write(self, text, end='', interrupted=None):
+        """A method printing the whole text at once, with a single write."""
+        self._write(self.cache.render(text, end))
+
+    def echo(self, text):
+        """A method printing text as it is, without wrapping or caching it,
+        e.g. the keys typed by the Player."""
+        self._write(text.encode(self.cache.encoding, 'replace'))
+
+    def _write(self, data):
+        """A method writing prepared bytes to the stream, straight to its file
+        descriptor if it has one."""
+        stream = self.stream
+        try:
+            fd = stream.fileno()
+        except (AttributeError, OSError, ValueError):  # e.g. io.StringIO
+            stream.write(data.decode(self.cache.encoding))
+            stream.flush()
+            return
+        stream.flush()  # anything the stream still holds comes first
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+
+class InstantSink(OutputSink):
+    """A child class of OutputSink, printing every message at once."""
+
+
+class TypewriterSink(OutputSink):
+    """A child class of OutputSink, printing messages with a typewriter
+    effect. Instead of flushing every character, all the characters that are
+    due in a frame are written and flushed together.
+
+    Attributes:
+    -------------
+    chars_per_second : float
+        The typing speed
+    frame_rate : float
+        How many times per second the text on the screen is updated
+    by_word : bool
+        Indicates if only whole words are put on the screen
+    max_line_time : float
+        If set, longer messages are typed faster so that none of them takes
+        more seconds than that
+
+    Methods:
+    -------------
+    write(text, end)
+    frames(text, end)
+    """
+
+    def __init__(self, chars_per_second=100, frame_rate=10, by_word=False,
+                 max_line_time=None, stream=None, cache=None):
+        super().__init__(stream, cache)
+        self.chars_per_second = chars_per_second
+        self.frame_rate = frame_rate
+        self.by_word = by_word
+        self.max_line_time = max_line_time
+
+    def write(self, text, end='', interrupted=None):
+        """A method typing out the text. If interrupted is given, it is called
+        instead of sleeping between the frames, with the number of seconds to
+        wait, and once it returns True the rest of the text is printed at
+        once."""
+        # The rest is cut from the same data as the frames, a resize in the
+        # meantime would wrap the text differently
+        data = self.cache.render(text, end)
+        written = 0
+        for number, chunk in enumerate(self._frames(data, end)):
+            if number:
+                if interrupted is None:
+                    time.sleep(1 / self.frame_rate)
+                elif interrupted(1 / self.frame_rate):
+                    self._write(data[written:])
+                    return
+            self._write(chunk)
+            written += len(chunk)
+
+    def frames(self, text, end=''):
+        """A method returning a generator splitting a prepared message into
+        the chunks of bytes to be put on the screen in consecutive frames,
+        one frame apart. The chunks follow the time actually passed since the
+        first one, so the typing speed stays the same even if frames come
+        late. The last chunk ends with end."""
+        return self._frames(self.cache.render(text, end), end)
+
+    def _frames(self, data, end):
+        """A generator splitting the prepared data of a message ending with
+        end into frames (see frames)."""
+        length = len(data) - len(end.encode(self.cache.encoding))
+        rate = self.chars_per_second
+        if self.max_line_time:
+            rate = max(rate, length / self.max_line_time)
+        start = time.perf_counter()
+        position = 0
+        while True:
+            due = int((time.perf_counter() - start) * rate) + 1
+            chunk_end = min(length, max(due, position + 1))
+            while chunk_end < length and data[chunk_end] & 0xC0 == 0x80:
+                chunk_end += 1  # never split an encoded character
+            if self.by_word:
+                space = data.find(b' ', chunk_end, length)
+                chunk_end = length if space == -1 else space + 1
+            if chunk_end >= length:
+                yield data[position:]
+                return
+            yield data[position:chunk_end]
+            position = chunk_end
+
+
+SINKS = {
+    'typewriter': TypewriterSink,
+    'word': lambda **options: TypewriterSink(by_word=True, **options),
+    'adaptive': lambda **options: TypewriterSink(max_line_time=2, **options),
+    'instant': InstantSink,
+}
+
+
+class Console:
+    """A class handling the terminal input and output of the game.
+
+    Attributes:
+    -------------
+    sink : OutputSink
+        The sink printing the narrative text
+    shows_text : bool
+        Indicates if the messages are shown at all; the story is played
+        without reading them if not
+
+    Methods:
+    -------------
+    write(text)
+    pause()
+    read(prompt)
+    """
+
+    shows_text = True
+
+    def __init__(self, sink=None):
+        self.sink = sink or TypewriterSink()
+
+    def write(self, text):
+        """A method printing a message to the terminal through the sink."""
+        self.sink.write(text, end='\n ...')
+
+    def pause(self):
+        """A method forcing the user for input to continue."""
+        input()
+
+    def read(self, prompt):
+        """A method getting a line of input from the user."""
+        return input(prompt)
+
+
+class ScriptedConsole(Console):
+    """A child class of Console, feeding prepared answers to the game without
+    any terminal input or output.
+
+    Attributes:
+    -------------
+    _choices : iterator
+        The answers given to the consecutive prompts
+
+    Methods:
+    -------------
+    write(text)
+    pause()
+    read(prompt)
+    """
+
+    shows_text = False
+
+    def __init__(self, choices):
+        super().__init__(InstantSink())
+        self._choices = iter(choices)
+
+    def write(self, text):
+        pass
+
+    def pause(self):
+        pass
+
+    def read(self, prompt):
+        """A method returning the next prepared answer. Raises EOFError when
+        there are no answers left, the same way input() does."""
+        for choice in self._choices:
+            return choice
+        raise EOFError(f'No answer left for prompt: {prompt}')
+
+
+class KeyboardConsole(Console):
+    """A child class of Console, reading the keys as they are pressed instead
+    of waiting for ENTER, so that the Player can skip ahead. Any key finishes
+    typing out the current message at once, the keys pressed in advance are
+    kept for the following pauses and questions (typeahead), and TAB
+    fast-forwards through the messages to the next question. Needs a Unix
+    terminal.
+
+    Attributes:
+    -------------
+    fast_forward : bool
+        Indicates if the messages are printed without stopping until the next
+        question
+    _fd : int
+        The file descriptor of the terminal input
+    _keys : str
+        The keys pressed and not used yet
+
+    Methods:
+    -------------
+    start()
+    stop()
+    write(text)
+    pause()
+    read(prompt)
+    """
+
+    FAST_FORWARD = '\t'
+
+    def __init__(self, sink=None, fd=None):
+        super().__init__(sink)
+        self.fast_forward = False
+        self._fd = sys.stdin.fileno() if fd is None else fd
+        self._keys = ''
+        self._attributes = None
+
+    def start(self):
+        """A method switching the terminal to reading single keys."""
+        self._attributes = termios.tcgetattr(self._fd)
+        tty.setcbreak(self._fd)
+
+    def stop(self):
+        """A method switching the terminal back to reading lines."""
+        if self._attributes is not None:
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._attributes)
+            self._attributes = None
+
+    def _poll(self, timeout=None):
+        """A method waiting up to timeout seconds (None for as long as it
+        takes) for keys to be pressed and keeping them."""
+        if select.select([self._fd], [], [], timeout)[0]:
+            keys = os.read(self._fd, 1024).decode('utf-8', 'replace')
+            if not keys or '\x04' in keys:  # Ctrl-D
+                raise EOFError()
+            if self.FAST_FORWARD in keys:
+                self.fast_forward = True
+                keys = keys.replace(self.FAST_FORWARD, '')
+            self._keys += keys.replace('\r', '\n')
+
+    def _interrupted(self, wait):
+        """A method waiting for a key for the given number of seconds while
+        a message is typed out. Returns True if the message is to be printed
+        at once; the key that finished the message is used up."""
+        if not self.fast_forward:
+            self._poll(wait)
+            if not self._keys:
+                return self.fast_forward
+            self._keys = self._keys[1:]
+        return True
+
+    def write(self, text):
+        """A method printing a message through the sink, at once if keys were
+        pressed in advance or a key is pressed while it is typed out."""
+        if self._keys or self.fast_forward:
+            interrupted = lambda wait: True  # noqa: E731
+        else:
+            interrupted = self._interrupted
+        self.sink.write(text, end='\n ...', interrupted=interrupted)
+
+    def pause(self):
+        """A method waiting for ENTER, unless it was pressed in advance or the
+        messages are fast-forwarded. Other keys pressed at a pause are
+        dropped."""
+        while not self.fast_forward:
+            enter = self._keys.find('\n')
+            if enter >= 0:
+                self._keys = self._keys[enter + 1:]
+                break
+            self._keys = ''
+            self._poll()
+        self.sink.write('', end='\n')  # the terminal does not echo ENTER
+
+    def read(self, prompt):
+        """A method getting a line of input from the user, starting with the
+        keys typed in advance, apart from the ENTERs meant for the pauses."""
+        self.fast_forward = False
+        self._keys = self._keys.lstrip('\n')
+        self.sink.write(prompt)
+        line = ''
+        while True:
+            while not self._keys:
+                self._poll()
+            key, self._keys = self._keys[0], self._keys[1:]
+            if key == '\n':
+                self.sink.echo('\n')
+                return line
+            if key in '\x7f\b':
+                if line:
+                    line = line[:-1]
+                    self.sink.echo('\b \b')
+            elif key.isprintable():
+                line += key
+                self.sink.echo(key)
+
+
+console = Console()
+story = load_story(STORY_PATH)
+hints = None  # the HintIndex of the story, if the Player can ask for hints
+HINT = 'hint'  # what the Player types at a question to get a hint
+_rooms = {}  # the shared rooms, by name
+
+Prompt = namedtuple('Prompt', ['text', 'choices'])
+Prompt.__doc__ = """A question asked to the Player.
+
+Attributes:
+-------------
+text : str
+    The question
+choices : tuple
+    The valid answers
+"""
 
 
 def slow_print(input_string):
     """A function slowing down printing messages and forcing the user for
     input to continue"""
-    for char in input_string:
-        sys.stdout.write(char)
-        sys.stdout.flush()
-        time.sleep(0.01)
-    sys.stdout.write('\n ...')
-    input()
+    console.write(input_string)
+    console.pause()
 
 
 class Player:
-    """A class representing the Player and handling all their mechanics.
+    """A class representing the Player and handling all their mechanics. The
+    Player's state is kept in a few slots, with the flags and the position
+    packed into integers, so that many idle Players take little memory.
 
     Attributes:
     -------------
@@ -24,62 +468,164 @@ class Player:
         The room in which the Player is currently staying
     _next_room : Room
         The room the Player is moving to after completion of _current_room
+    _position : int
+        The packed position, see position
     name : str
         The name of the Player
+    ending : str
+        The ending reached by the Player, None while the game is running
+    flags : int
+        The flags of the story set for the Player (e.g. has_key), as
+        a bitfield
     has_bottle : bool
         Indicates if the Player has obtained a specified item
     has_key : bool
         Indicates if the Player has obtained a specified item
+    position : tuple
+        The place in the story where the Player is, as the index of the node
+        and the number of its messages already shown, None once the game is
+        over
+    saves : SaveLog
+        The log the Player's progress is saved to, None if it is not saved
+    journal : Recording
+        The recording of the Player's game, None if it is not journaled
 
     Methods:
     -------------
+    resume(snapshot)
     enter_room(room)
+    move_to(room)
     exit_current_room_to(next_room)
     get_next_room(next_room)
-    enter_next_room(next_room)
+    enter_next_room()
+    checkpoint()
+    answer(prompt, choice)
     """
 
-    _current_room = None
-    _next_room = None
-    name = None
+    __slots__ = ('_current_room', '_next_room', '_position', 'name', 'ending',
+                 'flags', 'saves', 'journal')
 
     def __init__(self, initial_room, name):  # create object Player
         self.name = name
-        self.has_bottle = False
-        self.has_key = False
-        self._next_room = initial_room()  # execute initial room's story
+        self.ending = None
+        self.flags = 0
+        self.saves = None
+        self.journal = None
+        self._position = -1
+        self._current_room = None
+        if isinstance(initial_room, Room):
+            self._next_room = initial_room
+        else:  # a Room subclass
+            self._next_room = Room.named(initial_room.__name__)
+
+    @classmethod
+    def resume(cls, snapshot):
+        """A method creating a Player from a saved snapshot, placed in the
+        room and at the point of the story where the snapshot was taken."""
+        player = cls(Room.named(story.node(snapshot.node).room),
+                     snapshot.name)
+        player.flags = snapshot.flags
+        player.position = (snapshot.node, snapshot.cursor)
+        return player
+
+    @property
+    def position(self):
+        if self._position < 0:
+            return None
+        return self._position >> 16, self._position & 0xFFFF
+
+    @position.setter
+    def position(self, position):
+        if position is None:
+            self._position = -1
+        else:
+            self._position = position[0] << 16 | position[1]
+
+    @property
+    def has_bottle(self):
+        return bool(self.flags & story.flag_bit('has_bottle'))
+
+    @has_bottle.setter
+    def has_bottle(self, value):
+        self._set_flag('has_bottle', value)
+
+    @property
+    def has_key(self):
+        return bool(self.flags & story.flag_bit('has_key'))
+
+    @has_key.setter
+    def has_key(self, value):
+        self._set_flag('has_key', value)
+
+    def _set_flag(self, flag, value):
+        if value:
+            self.flags |= story.flag_bit(flag)
+        else:
+            self.flags &= ~story.flag_bit(flag)
 
     def enter_room(self, room):
         """A method handling entering a room by the Player. Assigns a prompted
         room as _current_room, sets _next_room to None. If _current_room is
         NoneType go back to game engine. Otherwise, enter the room assigned as
-        _current_room."""
+        _current_room and return the room it leads to."""
+        if self.move_to(room) is None:
+            return None
+        return self._current_room.enter(self)
+
+    def move_to(self, room):
+        """A method placing the Player in a room without running the room's
+        story, loading the room's part of the story and the rooms it leads to
+        in the background. Returns the room."""
         self._current_room = room
         self._next_room = None
-        if room is None:
-            pass
-        else:
-            self._current_room.enter(self)
+        if room is not None:
+            story.load_room(room._room_name, prefetch=True)
+            if (self.position is None
+                    or story.node(self.position[0]).room != room._room_name):
+                self.position = (story.find(room._room_name), 0)
+            if self.journal is not None:
+                self.journal.room(self)
+        return room
 
     def exit_current_room_to(self, next_room):
         """A method handling the change of _current_room by setting
-        _current_room to None and executing get_next_room method."""
+        _current_room to None and executing get_next_room method. Saves the
+        Player's progress at the room boundary."""
         self._current_room = None
-        self.get_next_room(next_room)
+        if next_room is None:
+            self.position = None
+            if self.journal is not None:
+                self.journal.end(self)
+        self.checkpoint()
+        return self.get_next_room(next_room)
 
     def get_next_room(self, next_room):
-        """A method handling setting _next_room and executing enter_next_room
-        method."""
+        """A method handling setting _next_room. Returns the room, so that the
+        game engine knows if there is anywhere left to go."""
         self._next_room = next_room
-        self.enter_next_room(self._next_room)
+        return self._next_room
 
-    def enter_next_room(self, next_room):
-        """A method allowing the Player to enter the next room."""
-        self.enter_room(next_room)
+    def enter_next_room(self):
+        """A method allowing the Player to enter the next room. Returns the
+        room the Player should go to afterwards."""
+        return self.enter_room(self._next_room)
+
+    def checkpoint(self):
+        """A method saving the Player's progress, if it is being saved."""
+        if self.saves is not None:
+            self.saves.save(self)
+
+    def answer(self, prompt, choice):
+        """A method recording the Player's answer to a question, if the game
+        is journaled. Returns the answer."""
+        if self.journal is not None:
+            self.journal.choice(self, prompt, choice)
+        return choice
 
 
 class Room:
-    """A parent class handling the main mechanics for each Room.
+    """A parent class handling the main mechanics for each Room. The story of
+    a room is read from the nodes of the story that belong to the room.
 
     Attributes:
     -------------
@@ -88,9 +634,13 @@ class Room:
 
     Methods:
     -------------
+    named(room_name)
     enter(player)
     exit(player)
     _on_entry(player)
+    run(player, messages)
+    events(player, messages)
+    _ways_out(node, player)
     _on_exit(player)
 
     Subclasses:
@@ -102,12 +652,34 @@ class Room:
     Basement
     """
 
-    def __init__(self):
-        self._room_name = self.__class__.__name__
+    def __init__(self, room_name=None):
+        self._room_name = room_name or self.__class__.__name__
+
+    @staticmethod
+    def named(room_name):
+        """A method returning the room with the given name, as an object of
+        the Room subclass of that name if there is one. Rooms do not hold any
+        state of the Players, so every room is created once and shared by all
+        of them."""
+        room = _rooms.get(room_name)
+        if room is None:
+            for subclass in Room.__subclasses__():
+                if subclass.__name__ == room_name:
+                    room = subclass()
+                    break
+            else:
+                room = Room(room_name)
+            _rooms[room_name] = room
+        return room
 
     def enter(self, player):
-        """A method handling entering the room."""
-        self._on_entry(player)
+        """A method handling entering the room. Runs the room's story, exits
+        the room and returns the room the Player goes to next (None if the
+        game is over). Rooms never enter the next room themselves, so the
+        stack does not grow with the number of rooms visited."""
+        next_room = self._on_entry(player)
+        self.exit(player)
+        return next_room
 
     def exit(self, player):
         """A method that checks if anything happened to the Player while
@@ -115,8 +687,78 @@ class Room:
         self._on_exit(player)
 
     def _on_entry(self, player):
-        """A method running the room's story."""
-        self.exit(player)
+        """A method running the room's story in the terminal. Returns the next
+        room."""
+        return drive(self.run(player, console.shows_text), slow_print,
+                     lambda prompt: self.user_choice(prompt.text,
+                                                     prompt.choices, player))
+
+    def run(self, player, messages=True):
+        """A generator running the room's story the way events does, saving
+        the Player's progress at every question and recording the answers
+        sent back (see Player.checkpoint and Player.answer). Returns the
+        next room."""
+        events = self.events(player, messages)
+        try:
+            event = next(events)
+            while True:
+                if isinstance(event, Prompt):
+                    player.checkpoint()
+                    choice = yield event
+                    event = events.send(player.answer(event.text, choice))
+                else:
+                    yield event
+                    event = next(events)
+        except StopIteration as stop:
+            return stop.value
+
+    def events(self, player, messages=True):
+        """A generator running the room's story, starting from the Player's
+        position (the node named like the room when the Player has just
+        entered it). Yields the messages for the Player (str, unless messages
+        is False, so that a game nobody watches does not read them) and the
+        questions to the Player (Prompt), the answer to a Prompt has to be
+        sent back. Returns the next room.
+
+        The story does not do any input or output by itself, so that it can be
+        driven by the terminal as well as e.g. by a network session."""
+        index, cursor = player.position
+        node = story.node(index)
+        while True:
+            if messages:
+                for text in node.texts[cursor:]:
+                    if '{' in text:
+                        text = text.replace('{name}', player.name)
+                    yield text
+            cursor = 0
+            player.flags |= node.set_mask
+            if node.ending is not None:
+                player.ending = node.ending
+                if messages:
+                    yield node.ending
+            edges = self._ways_out(node, player)
+            # A question none of whose answers is available ends the game
+            if node.prompt is not None and edges:
+                player.position = (index, len(node.texts))
+                choice = yield Prompt(node.prompt,
+                                      tuple(edge.choice for edge in edges))
+                edges = [edge for edge in edges if edge.choice == choice]
+            if not edges or edges[0].target == END:
+                return None
+            index = edges[0].target
+            node = story.node(index)
+            if node.room != self._room_name:
+                player.position = (index, 0)
+                return Room.named(node.room)
+
+    @staticmethod
+    def _ways_out(node, player):
+        """A method returning the ways out of a node whose guards hold for the
+        Player."""
+        flags = player.flags
+        return [edge for edge in node.edges
+                if flags & edge.require == edge.require
+                and not flags & edge.forbid]
 
     def _on_exit(self, player):
         """A method that executes events that happen to the Player while
@@ -124,460 +766,310 @@ class Room:
         pass
 
     @staticmethod
-    def user_choice(prompt, choices):
-        """ A method handling getting input from the Player."""
+    def user_choice(prompt, choices, player=None):
+        """ A method handling getting input from the Player. If hints are
+        available, the Player can type HINT to learn the best answer to the
+        question they are at."""
         while True:
-            choice = input(f'{prompt}')
+            choice = console.read(f'{prompt}').strip()
             if choice in choices:
                 return choice
+            if (hints is not None and player is not None
+                    and choice.lower() == HINT):
+                slow_print(hints.advice(player.position[0], player.flags,
+                                        player.ending))
 
 
 class DarkRoom(Room):
-    """A child class of Room, handling the story for the Dark Room.
-
-    Attributes:
-    -------------
-    _room_name : str
-        The name of the room
-
-    Methods:
-    -------------
-    _on_entry(player)
-    choice_room(player)
-    """
-
-    def __init__(self):
-        super().__init__()
-
-    def _on_entry(self, player):
-        slow_print('You wake up in a dark room. You don\'t know where you are.'
-                   ' Why are you here?')
-        slow_print('"Oh yes. My friend is in danger. I must find her!" you '
-                   'recall.')
-        slow_print('Suddenly, you feel chilly. The Darkness around you seems '
-                   'to leech the air that you breathe.')
-        slow_print('"I must get out of here or I\'m gonna be consumed" you '
-                   'think.')
-        slow_print('You stand up and look around. There are two doors - the '
-                   'left and the right one.')
-        slow_print('"Which one should I choose?" you wonder.')
-        self.choice_room(player)
-
-    def choice_room(self, player):
-        choice = self.user_choice('Go left (1) or right (2)?', ['1', '2'])
-        if choice == '1':
-            slow_print('You decide to go left.')
-            player.exit_current_room_to(next_room=Stairs())
-        elif choice == '2':
-            slow_print('You decide to go right.')
-            player.exit_current_room_to(next_room=MonsterRoom())
+    """A child class of Room, handling the story for the Dark Room, where the
+    game begins."""
 
 
 class Stairs(Room):
-    """A child class of Room, handling the story for the Stairs.
-
-    Attributes:
-    -------------
-    _room_name : str
-        The name of the room
-
-    Methods:
-    -------------
-    _on_entry(player)
-    first_choice(player)
-    second_choice(player)
-    """
-
-    def __init__(self):
-        super().__init__()
-
-    def _on_entry(self, player):
-        slow_print('When you open the door you see a devastated stone stairs. '
-                   'They don\'t look very stable. Also, there are some cracked'
-                   ' spaces on the way. However, maybe the stairs might '
-                   'withstand?...')
-        self.first_choice(player)
-
-    def first_choice(self, player):
-        choice = self.user_choice('Use stairs (yes/no)?', ['yes', 'no'])
-        if choice == 'yes':
-            slow_print('The stairs suddenly collapse under your weight!')
-            player.exit_current_room_to(next_room=None)
-        elif choice == 'no':
-            slow_print('"There must be another way. Maybe I should look '
-                       'around." you think.')
-            self.second_choice(player)
-
-    def second_choice(self, player):
-        slow_print('You may try to jump over the cracks. On the other hand, '
-                   'you notice a line hanging down next to the stairs. It '
-                   'looks quite old and worn.')
-        choice = self.user_choice('Try to jump (1) or use the rope (2)?',
-                                  ['1', '2'])
-        if choice == '1':
-            slow_print('That was a bad decision. You fell into abyss.')
-            player.exit_current_room_to(next_room=None)
-        elif choice == '2':
-            slow_print('You reach the bottom and find a door. You enter the '
-                       'next room.')
-            player.exit_current_room_to(next_room=Prison())
+    """A child class of Room, handling the story for the Stairs."""
 
 
 class MonsterRoom(Room):
-    """A child class of Room, handling the story for the Monster Room.
-
-    Attributes:
-    -------------
-    _room_name : str
-        The name of the room
-
-    Methods:
-    -------------
-    _on_entry(player)
-    choice_monster(player)
-    """
-
-    def __init__(self):
-        super().__init__()
-
-    def _on_entry(self, player):
-        slow_print('You enter the room and see a huge monster at the center. '
-                   'It seems to be asleep.')
-        slow_print('"Maybe I should get rid of this monster while it\'s '
-                   'asleep? It may be problematic later when it wakes up" a '
-                   'though appeared in your head.')
-        self.choice_monster(player)
-
-    def choice_monster(self, player):
-        choice = self.user_choice('Attack monster (yes/no)?', ['yes', 'no'])
-        if choice == 'yes':
-            slow_print('You take a chance and attack the monster, inflicting '
-                       'a wound. The monster wakes up momentarily and quickly '
-                       'throwing off the surprise it charges towards you. It '
-                       'moves so fast that you have no time to guard.')
-            slow_print('The monster ripped out your heart.')
-            player.exit_current_room_to(next_room=None)
-        elif choice == 'no':
-            slow_print('"Nah, it\'s not worth it." you think. You quietly '
-                       'advance through the room. The monster seems to be '
-                       'still asleep as you reach the next door.')
-            player.exit_current_room_to(next_room=Prison())
+    """A child class of Room, handling the story for the Monster Room."""
 
 
 class Prison(Room):
-    """A child class of Room, handling the story for the Prison.
+    """A child class of Room, handling the story for the Prison, where the
+    Player may obtain the bottle and the key."""
 
-    Attributes:
-    -------------
-    _room_name : str
-        The name of the room
 
-    Methods:
-    -------------
-    _on_entry(player)
-    event_prisoner(player)
-    event_guard(player)
-    """
+class Basement(Room):
+    """A child class of Room, handling the story for the Basement, where the
+    game ends."""
 
-    def __init__(self):
-        super().__init__()
 
-    def _on_entry(self, player):
-        slow_print('You enter a room with cells. "It looks like a prison" you '
-                   'think.')
-        slow_print('You wander a while in the corridors. Most of cells are '
-                   'empty, in some you notice human skeletons.')
-        slow_print('"What a horrible place to be in" you presume.')
-        self.event_prisoner(player)
-
-    def event_prisoner(self, player):
-        slow_print('"Who\'s there?" you suddenly hear a faint voice. You '
-                   'quickly look around and see that there is a live prisoner '
-                   'in one of the cells. He looks miserable and weak now, but '
-                   'guessing from his physique it seems that he used to be a '
-                   'muscular man.')
-        slow_print('"Hey you. You\'re not a guard, are you? Please, get me out'
-                   ' of here! I\'m innocent! Look, the key to the cell is '
-                   'right there" he points behind you back. The key is indeed '
-                   'hanging on a spike on the wall.')
-        choice = self.user_choice('Should you free the prisoner (yes/no)?',
-                                  ['yes', 'no'])
-        if choice == 'yes':
-            slow_print('"Nobody should stay here." you think while taking the '
-                       'key to the cell. You open the door. The prisoner looks'
-                       ' surprised and thankful.')
-            slow_print('"Thank you, kind sir. I\'m not gonna forget this! It '
-                       'may not be much, but please take this bottle. It\'s a '
-                       'potion that release you from poison. Maybe you\'ll '
-                       'find it useful. Farewell!" he says while bowing his '
-                       'head slightly.')
-            slow_print('The prisoner leaves quickly. You put the bottle into '
-                       'your pocket.')
-            player.has_bottle = True
-            self.event_guard(player)
-        elif choice == 'no':
-            slow_print('"Why should I free this man? He probably bluffs about '
-                       'his innocence. What if he\'s a dangerous inmate who '
-                       'will take advantage of my kindness? I can\'t waste '
-                       'time here. My friend needs my help!" you think and '
-                       'quickly go further ')
-            self.event_guard(player)
-
-    def event_guard(self, player):
-        slow_print('You continue your journey through the prison. Suddenly, '
-                   'you run into a guard.')
-        slow_print('"Who are you?! Surrender!" he shouts.')
-        fight_run = self.user_choice('Should you fight (1) or try to escape '
-                                     '(2)?', ['1', '2'])
-        if fight_run == '1':
-            slow_print('You notice a metal pipe lying nearby. You take a '
-                       'chance in a fight with the guard!')
-            slow_print('The guard does not seem to be very bright. You manage '
-                       'to get him down.')
-            slow_print('As soon as he is disarmed, the guard shouts: "Have '
-                       'mercy! I have a wife and a child to feed. I don\'t '
-                       'want to be here either!"')
-            spare = self.user_choice('Should you spare the guard (yes/no)?',
-                                     ['yes', 'no'])
-            if spare == 'yes':
-                slow_print('You decide to spare the guard. He looks shocked. '
-                           'He stands up slowly.')
-                slow_print('"I don\'t know what to say... Thank you" he '
-                           'stutters.')
-                slow_print('"My friend... She is held captive here" you say.')
-                slow_print('The guard quickly looks around and starts to poke '
-                           'in his sack. Finally, he pulls out a bronze key.')
-                slow_print('"Take it" he whispers and gives you the key. He '
-                           'turns his back on you.')
-                slow_print('"I haven\'t seen anyone." he says and leaves into '
-                           'the labyrinth.')
-                slow_print('You put the key into your pocket. It\'s time to '
-                           'move.')
-                player.has_key = True
-                player.exit_current_room_to(next_room=Basement())
-            elif spare == 'no':
-                slow_print('You decide to silence the guard permanently. You '
-                           'take guard\'s sword lying nearby. The blade '
-                           'quickly slices guard\'s throat. The guard tries to'
-                           ' gasp some air, but ultimately he succumbs. You '
-                           'move his lifeless body in an open empty cell.')
-                slow_print('Suddenly, you hear voices approaching. You have no'
-                           ' time to search the guard. You move quickly '
-                           'further into the labyrinth.')
-                player.exit_current_room_to(next_room=Basement())
-        elif fight_run == '2':
-            slow_print('You try to escape the guard. He shouts after you and '
-                       'begins to pursue. He\'s quick, you can feel that he\'s'
-                       ' right behind you. The next turn you take you meet a '
-                       'dead end. You gasp in desperation, but the next moment'
-                       ' you feel a sword spiking you through your guts.')
-            slow_print('You bleed out.')
-            player.exit_current_room_to(next_room=None)
+def use_story(path):
+    """Load the story from the given path and play it from now on."""
+    global story, hints
+    story = load_story(path)
+    hints = None
 
 
-class Basement(Room):
-    """A child class of Room, handling the story for the Basement.
+def use_hints():
+    """Work out the hints to the questions of the story, and let the Player
+    ask for them."""
+    global hints
+    from explorer import Explorer
+    from hints import HintIndex
+    hints = HintIndex(Explorer(story))
 
-    Attributes:
-    -------------
-    _room_name : str
-        The name of the room
-    _happy_end : bool
-        Indicates if the game ends with a happy end
 
-    Methods:
-    -------------
-    _on_entry(player)
-    rescue_friend(player)
-    _on_exit(player)
-    """
-
-    def __init__(self):
-        super().__init__()
-        self._happy_end = False
-
-    def _on_entry(self, player):
-        slow_print('You finally reach a door that is not a cell door. You '
-                   'cautiously open the door and enter the next room. You '
-                   'see only one cell here. ')
-        slow_print('"' + player.name + '!" somebody calls your name.')
-        slow_print('You turn towards the source of voice. It\'s your '
-                   'friend...')
-        slow_print('"Ann..." you share a tear when you see her poor condition.'
-                   ' Her golden hair has been cut, her face seems dry, she\'s'
-                   ' skinny...')
-        self.rescue_friend(player)
-
-    def rescue_friend(self, player):
-        approach = self.user_choice('Should you get closer quickly (1) or '
-                                    'slowly (2)?', ['1', '2'])
-        if approach == '1':
-            slow_print('You rush towards the cell. Unfortunately, you haven\'t'
-                       ' noticed that a tile on your way looks a little '
-                       'different than others. You pressed some mechanism. '
-                       'Suddenly, you hear a swish and your friend\'s cry. '
-                       'When you get to the cell, you notice that Ann is '
-                       'quickly getting purple.')
-            slow_print('"Poison..." she gasps.')
-            if player.has_bottle:
-                slow_print('Thoughts run through your mind in the speed of '
-                           'light. "The bottle!" it reaches you.')
-                slow_print('You give Ann the bottle. "Drink it, quickly!" you '
-                           'insist. She barely manages to empty the bottle. '
-                           'She breathes deeply for a minute and then the '
-                           'purple color goes off her face.')
-                slow_print('"Thank you, ' + player.name + '..." she whispers '
-                                                          'faintly.')
-                slow_print('You feel relieved. Now you can think how to get '
-                           'Ann out of here.')
-                if player.has_key:
-                    slow_print('You try to unlock the cell using the bronze '
-                               'key. It works!')
-                    slow_print('"Ann, come with me. Use my shoulder" you say.')
-                    slow_print('Ann smiles weakly and both of you exit the '
-                               'room. After some time you manage to reach the '
-                               'exit.')
-                    slow_print('You take a deep breath as you get outside. '
-                               '"It\'s gonna be ok" you think.')
-                    self._happy_end = True
-                    self._on_exit(player)
-                else:
-                    slow_print('"How do I get her out?" you think looking '
-                               'around.')
-                    slow_print('You desperately try to find a way to open the '
-                               'cell. You still have the metal pipe from '
-                               'prison, which you use in your attempt to open '
-                               'the cell. After some struggle you manage to '
-                               'break the lock. However, you make a lot of '
-                               'noise and two guards appear quickly.')
-                    slow_print('"Hold! Don\'t move!" one of guards yells.')
-                    slow_print('The metal pipe is useless after breaking the '
-                               'lock. You have no means to defend. The guards '
-                               'apprehend you and throw you to a dark cell.')
-                    slow_print('"Stay here, you scum!" they shout and leave '
-                               'laughing.')
-                    slow_print('...')
-                    slow_print('"Well, well" you hear a sinister thin voice '
-                               '"So you are weak. Well, weak people are also '
-                               'tasty" it cackles.')
-                    slow_print('It\'s getting harder to breathe...')
-                    slow_print('The Darkness consumed you. Behold eternal '
-                               'pain...')
-                    self._happy_end = False
-                    self._on_exit(player)
-            else:
-                if player.has_key:
-                    slow_print('You quickly get the bronze key out of your '
-                               'pocket. You struggle with the lock as your '
-                               'hands are shaking. Finally, you open the cell '
-                               'and grasp Ann into your arms.')
-                    slow_print('"No... Please, Ann... Don\'t go..." you sob as'
-                               ' Ann foam appears on her mouth.')
-                    slow_print('Few minutes later her body shudders and '
-                               'subsides.')
-                    slow_print('...')
-                    slow_print('The only thing you feel is despair.')
-                    slow_print('...')
-                    slow_print('"Splendid..." you hear a sinister thin voice '
-                               '"Your despair is mine" it cackles.')
-                    slow_print('It\'s getting harder to breathe...')
-                    slow_print('The Darkness consumed you. Behold eternal '
-                               'pain...')
-                    self._happy_end = False
-                    self._on_exit(player)
-                else:
-                    slow_print('You desperately try to break the lock using '
-                               'the metal pipe. However, before you manage to '
-                               'do so, Ann is lying lifelessly on the ground. '
-                               'Before you are able to open the cell doors two'
-                               ' guards are lured by the noise.')
-                    slow_print('"Hold! Don\'t move!" one of guards yells.')
-                    slow_print('You ignore the guards and still try to break '
-                               'the lock. The guards don\'t wait until you '
-                               'break in. They apprehend you and throw you to '
-                               'a dark cell.')
-                    slow_print('"Stay here, you scum!" they shout and leave '
-                               'laughing.')
-                    slow_print('...')
-                    slow_print('"Well, well" you hear a sinister thin voice '
-                               '"So you are weak. Well, weak people are also '
-                               'tasty" it cackles.')
-                    slow_print('It\'s getting harder to breathe...')
-                    slow_print('The Darkness consumed you. Behold eternal '
-                               'pain...')
-                    self._happy_end = False
-                    self._on_exit(player)
-        elif approach == '2':
-            slow_print('You approach cautiously. Looking around you notice '
-                       'that one of tiles looks different. You skip the slab. '
-                       'You cautiously approach Ann\'s cell.')
-            slow_print('"Are you all right?" you ask quietly.')
-            slow_print('"I\'m good." she replies "I\'m only a little '
-                       'weakened"')
-            if player.has_key:
-                slow_print('You try to unlock the cell using the bronze key. '
-                           'It works!')
-                slow_print('"Ann, come with me. Use my shoulder" you say.')
-                slow_print('Ann smiles weakly and both of you exit the room. '
-                           'After some time you manage to reach the exit.')
-                slow_print('You take a deep breath as you get outside. "It\'s '
-                           'gonna be ok" you think.')
-                self._happy_end = True
-                self._on_exit(player)
+def drive(events, say, answer):
+    """Drive a generator of the story's events (see Room.run) to its end:
+    say(message) is called for every message (unless say is None) and
+    answer(prompt) for every Prompt, the answer it returns is sent back.
+    Returns what the generator returns."""
+    try:
+        event = next(events)
+        while True:
+            if isinstance(event, Prompt):
+                event = events.send(answer(event))
             else:
-                slow_print('You desperately try to find a way to open the '
-                           'cell. You still have the metal pipe from prison, '
-                           'which you use in your attempt to open the cell. '
-                           'After some struggle you manage to break the lock.'
-                           ' However, you make a lot of noise and two guards '
-                           'appear quickly.')
-                slow_print('"Hold! Don\'t move!" one of guards yells.')
-                slow_print('You open the cell doors and the moment you enter, '
-                           'the other guard shoot a bolt from his crossbow. '
-                           'Before you can do anything, you find yourself '
-                           'holding Ann. Blood is pouring from her chest where'
-                           ' the bolt landed.')
-                slow_print('"Ann!" you cry.')
-                slow_print('She smiles weakly and whispers: "I\'m glad... '
-                           'You\'re ok...".')
-                slow_print('Suddenly, her body shudders and subsides.')
-                slow_print('...')
-                slow_print('"...What...?" you stammer in shock. You feel anger'
-                           ' flowing through you.')
-                slow_print('"Get up, you scum!" you hear a guard\'s shout. You'
-                           ' stand up and everything turns black.')
-                slow_print('...')
-                slow_print('The next moment you snap out you stand in the pool'
-                           ' of blood. There are at least ten guards lying at '
-                           'your feet. The air is filled with the smell of '
-                           'blood. The only thing you feel is despair.')
-                slow_print('"Splendid..." you hear a sinister thin voice "Your'
-                           ' anger is mine" it cackles.')
-                slow_print('It\'s getting harder to breathe...')
-                slow_print('The Darkness consumed you. Behold eternal pain...')
-                self._happy_end = False
-                self._on_exit(player)
-
-    def _on_exit(self, player):
-        if self._happy_end:
-            slow_print('HAPPY END')
-        else:
-            slow_print('BAD END')
-        player.exit_current_room_to(next_room=None)
+                if say is not None:
+                    say(event)
+                event = next(events)
+    except StopIteration as stop:
+        return stop.value
+
+
+def play_rooms(player, messages=True, entered=None):
+    """A generator playing the rooms one after another, from the Player's
+    next room to the end of the game, the same way game_engine does but
+    without any input or output. Yields the events of the rooms (see
+    Room.run), the answer to a Prompt has to be sent back. entered(room) is
+    called for every room the Player enters."""
+    while player.get_next_room(player._next_room):
+        room = player.move_to(player._next_room)
+        if entered is not None:
+            entered(room)
+        next_room = yield from room.run(player, messages)
+        room.exit(player)
+        player.exit_current_room_to(next_room)
 
 
 def game_engine(player):
     """Game engine function. As long as the Player object can access the next
-    room, enter that room. Otherwise, exit the game."""
+    room, enter that room and move on to the room it leads to. Otherwise, exit
+    the game."""
     while player.get_next_room(player._next_room):
-        player.enter_next_room()
+        player.exit_current_room_to(player.enter_next_room())
     else:
         slow_print('Game over')
 
 
-if __name__ == '__main__':
+PlaythroughResult = namedtuple('PlaythroughResult',
+                               ['rooms', 'has_bottle', 'has_key', 'ending'])
+PlaythroughResult.__doc__ = """The outcome of a headless playthrough.
+
+Attributes:
+-------------
+rooms : tuple
+    The names of the rooms visited, in order
+has_bottle : bool
+    Indicates if the Player has obtained the bottle
+has_key : bool
+    Indicates if the Player has obtained the key
+ending : str
+    'HAPPY END' or 'BAD END', None if the choices ran out before the end
+"""
+
+
+def simulate(choices, name='Player', player=None):
+    """Play the game from the DarkRoom (or on from where the given Player is)
+    without any terminal input or output, answering consecutive prompts with
+    the given choices. Returns a PlaythroughResult."""
+    global console
+    previous_console, console = console, ScriptedConsole(choices)
+    if player is None:
+        player = Player(DarkRoom, name)
+    rooms = []
+    try:
+        while player.get_next_room(player._next_room):
+            rooms.append(player._next_room._room_name)
+            player.exit_current_room_to(player.enter_next_room())
+        ending = player.ending or DEFAULT_ENDING
+    except EOFError:
+        ending = None
+    finally:
+        console = previous_console
+    return PlaythroughResult(tuple(rooms), player.has_bottle, player.has_key,
+                             ending)
+
+
+def simulate_batch(choice_sequences, name='Player'):
+    """Run simulate for each of the given choice sequences and return the list
+    of their results."""
+    return [simulate(choices, name) for choices in choice_sequences]
+
+
+ReplayResult = namedtuple('ReplayResult', ['game', 'ending', 'difference'])
+ReplayResult.__doc__ = """The outcome of replaying a journaled game.
+
+Attributes:
+-------------
+game : str
+    The id of the game
+ending : str
+    The ending reached by the replay, None if the journal ends before the end
+    of the game
+difference : tuple
+    The number of the first record that came out differently and the
+    journaled and replayed records, None if the replay took the same course
+"""
+
+
+def replay(records):
+    """Replay a game from its journal records at full speed, without any
+    terminal input or output, and compare the rooms, answers, flags and ending
+    with the journaled ones. Returns a ReplayResult."""
+    start = records[0]
+    player = Player(Room.named(start['room']), start['name'])
+    if start['node'] is not None:
+        player.position = (story.find(start['node']), start['cursor'])
+    for flag in start['flags']:
+        player.flags |= story.flag_bit(flag)
+    player.journal = Recording(None, story, start['game'], player)
+    choices = [record['choice'] for record in records
+               if record['event'] == 'choice']
+    result = simulate(choices, start['name'], player)
+    return ReplayResult(start['game'], result.ending,
+                        first_difference(records, player.journal.records))
+
+
+def replay_journals(paths):
+    """Replay all the games of the given journals and print the ones that
+    came out differently. Returns the number of those games."""
+    games = differences = 0
+    for path in paths:
+        for records in load_journal(path).values():
+            result = replay(records)
+            games += 1
+            if result.difference is not None:
+                differences += 1
+                number, journaled, replayed = result.difference
+                print(f'{path}: game {result.game} differs at record '
+                      f'{number}:\n  journaled: {journaled}\n'
+                      f'  replayed:  {replayed}')
+    print(f'{games} games replayed, {differences} differ')
+    return differences
+
+
+def profile(path, journals=None, answers=None, repeat=100):
+    """Play the games of the journals, or the answers (all the ways of
+    playing the story if None) repeat times, under a Profiler. Write the
+    collapsed stacks to path and print the summary."""
+    from profiling import Profiler
+    if journals:
+        games = [records for journal in journals
+                 for records in load_journal(journal).values()]
+
+        def play():
+            for records in games:
+                replay(records)
+    else:
+        if answers is None:
+            from explorer import Explorer
+            answers = [path for path, _ in Explorer(story).paths()]
+        else:
+            answers = [answers]
+
+        def play():
+            for _ in range(repeat):
+                simulate_batch(answers)
+    profiler = Profiler(Room)
+    profiler.run(play)
+    profiler.write_collapsed(path)
+    print(profiler.summary())
+
+
+def main(argv=None):
+    """Parse the command line options, set up the console and run the game."""
+    global console
+    parser = argparse.ArgumentParser(description='A text-based adventure '
+                                                 'game.')
+    parser.add_argument('--text', choices=sorted(SINKS), default='typewriter',
+                        help='the way the narrative text is printed')
+    parser.add_argument('--line-input', action='store_true',
+                        help='wait for ENTER after every message, without '
+                             'skipping ahead with the keys')
+    parser.add_argument('--story', default=STORY_PATH,
+                        help='the story to play, in the text or compiled '
+                             'form')
+    parser.add_argument('--save', metavar='PATH',
+                        help='save the progress to the given file, and offer '
+                             'to resume a game saved there')
+    parser.add_argument('--telemetry', metavar='PATH',
+                        help='record the time spent in the rooms and on the '
+                             'questions, the answers and the ending as JSON '
+                             'lines to the given file')
+    parser.add_argument('--journal', metavar='PATH',
+                        help='record every room, answer and flag of the game '
+                             'to the given file')
+    parser.add_argument('--replay', metavar='PATH', nargs='+',
+                        help='replay the games of the given journals at full '
+                             'speed and check that they take the same course')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='play the games of --replay, or the --answers, '
+                             'at full speed under a profiler, write the '
+                             'collapsed stacks to the given file and print '
+                             'a summary')
+    parser.add_argument('--answers', nargs='+', metavar='ANSWER',
+                        help='the answers of the game played by --profile, '
+                             'all the ways of playing the story by default')
+    parser.add_argument('--repeat', type=int, default=100,
+                        help='how many times --profile plays the answers')
+    args = parser.parse_args(argv)
+    if args.profile:
+        use_story(args.story)
+        profile(args.profile, args.replay, args.answers, args.repeat)
+        return
+    if args.replay:
+        use_story(args.story)
+        sys.exit(1 if replay_journals(args.replay) else 0)
+    if args.telemetry:
+        from telemetry import Telemetry
+        telemetry = Telemetry(Room, args.telemetry)
+        telemetry.start()
+    text_cache.follow_terminal()
+    use_story(args.story)
+    use_hints()
+    saves = SaveLog(args.save, story) if args.save else None
     # Create object Player with a specified initial room and start game engine
-    name_ = input('Name yor character: ')
-    slow_print('---Press ENTER to continue when you see "..."---')
-    player_ = Player(DarkRoom, name_)
-    game_engine(player_)
+    try:
+        name_ = input('Name yor character: ')
+        if (termios is not None and not args.line_input
+                and sys.stdin.isatty() and sys.stdout.isatty()):
+            console = KeyboardConsole(SINKS[args.text]())
+            console.start()
+        else:
+            console = Console(SINKS[args.text]())
+        slow_print('---Press ENTER to continue when you see "..." and type '
+                   f'"{HINT}" at a question if you are stuck---')
+        snapshot = saves.get(name_) if saves else None
+        if snapshot and Room.user_choice('Continue the saved game (yes/no)?',
+                                         ['yes', 'no']) == 'yes':
+            player_ = Player.resume(snapshot)
+        else:
+            player_ = Player(DarkRoom, name_)
+        player_.saves = saves
+        if args.journal:
+            Journal(args.journal, story).start(player_)
+        game_engine(player_)
+    except (EOFError, KeyboardInterrupt):
+        # The input has ended (e.g. the Player has disconnected) or the Player
+        # has quit; the progress is saved at every question already
+        print('\nGame interrupted')
+    finally:
+        if isinstance(console, KeyboardConsole):
+            console.stop()
+        if args.telemetry:
+            telemetry.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+"""Benchmarks of the game engine, the text rendering and the memory taken by
+the Players. All of them are driven by scripted answers, without any delays.
+
+Usage:
+
+    python benchmarks.py [-o benchmarks.json] [--compare old.json]
+
+The results are written as JSON, together with the commit they were measured
+at, so that runs at different commits can be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import timeit
+import tracemalloc
+from collections import defaultdict
+
+import adventure_game
+from adventure_game import (Console, DarkRoom, InstantSink, Player, Room,
+                            slow_print)
+from explorer import Explorer
+
+SAMPLE_TEXT = tuple(adventure_game.story.node(
+    adventure_game.story.find('Prison')).texts)
+
+
+class _NullConsole(Console):
+    """A console rendering into memory and never waiting for the Player."""
+
+    def pause(self):
+        pass
+
+
+def _best(statement, number, repeat=5):
+    """A function returning the best time of a single run of statement, in
+    seconds."""
+    return min(timeit.repeat(statement, number=number, repeat=repeat)) / number
+
+
+def bench_transition():
+    """The time of moving the Player to the next room: exit_current_room_to,
+    get_next_room and entering the room without running its story."""
+    player = Player(DarkRoom, 'Bench')
+    prison = Room.named('Prison')
+
+    def transition():
+        player.exit_current_room_to(prison)
+        player.move_to(player._next_room)
+
+    return {'value': _best(transition, 20000) * 1e9, 'unit': 'ns'}
+
+
+def bench_rendering():
+    """The number of characters slow_print renders per second when printing
+    at once to a file descriptor (os.devnull), the way it prints to the
+    terminal."""
+    stream = open(os.devnull, 'w')
+    previous = adventure_game.console
+    adventure_game.console = _NullConsole(InstantSink(stream))
+    characters = sum(len(text) for text in SAMPLE_TEXT)
+
+    def render():
+        for text in SAMPLE_TEXT:
+            slow_print(text)
+
+    try:
+        seconds = _best(render, 2000)
+    finally:
+        adventure_game.console = previous
+        stream.close()
+    return {'value': characters / seconds, 'unit': 'chars/s'}
+
+
+def bench_playthroughs():
+    """The average time of a headless playthrough, for every ending."""
+    by_ending = defaultdict(list)
+    for answers, ending in Explorer(adventure_game.story).paths():
+        by_ending[ending].append(answers)
+    results = {}
+    for ending, paths in sorted(by_ending.items()):
+        def play():
+            for answers in paths:
+                adventure_game.simulate(answers)
+        seconds = _best(play, 200) / len(paths)
+        results[f'playthrough {ending}'] = {'value': seconds * 1e6,
+                                            'unit': 'us'}
+    return results
+
+
+def bench_session_memory(sessions=10000):
+    """The peak memory taken by a live Player waiting at a question."""
+    prompt = adventure_game.story.find('Prison.guard')
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    players = []
+    for number in range(sessions):
+        player = Player(DarkRoom, f'Player {number}')
+        player.move_to(Room.named('Prison'))
+        player.position = (prompt, 2)
+        player.has_bottle = True
+        players.append(player)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'value': (peak - start) / sessions, 'unit': 'bytes'}
+
+
+def run():
+    """A function running all the benchmarks. Returns the results by
+    name."""
+    results = {'transition': bench_transition(),
+               'rendering': bench_rendering()}
+    results.update(bench_playthroughs())
+    results['session memory'] = bench_session_memory()
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    """Parse the command line options, run the benchmarks and write their
+    results."""
+    parser = argparse.ArgumentParser(description='Benchmark the game.')
+    parser.add_argument('-o', '--output', default='benchmarks.json',
+                        help='the file the results are written to')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='the results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+    results = run()
+    with open(args.output, 'w') as file:
+        json.dump({'commit': _commit(), 'time': time.time(),
+                   'python': platform.python_version(),
+                   'results': results}, file, indent=2)
+    previous = {}
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)['results']
+    for name, result in results.items():
+        line = f'{name:28} {result["value"]:14.1f} {result["unit"]}'
+        if name in previous:
+            line += f'  ({result["value"] / previous[name]["value"]:.2f}x)'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/python3
+"""An analyzer of all the ways a story can be played.
+
+What happens in a node depends only on the node, on the Player's flags and
+on the last ending reached (which the game ends with if it ends in a node
+without an ending of its own), so the story is explored as a graph of (node,
+flags, ending) states. Every state is
+visited once, and the results for the states (reachable endings, number of
+paths, ending probabilities) are computed by dynamic programming over that
+graph instead of following every path separately.
+
+Usage:
+
+    python explorer.py [story.txt] [--weights '{"yes": 2}'] [--paths 20]
+"""
+
+import argparse
+import json
+from collections import Counter, deque
+from itertools import islice
+
+from adventure_game import STORY_PATH
+from story import DEFAULT_ENDING, END, load_story
+
+_FLAGS = 0xFFFFFFFF
+
+
+def state_of(node, flags, ending=0):
+    """A function packing a node index, the Player's flags and the number of
+    the last ending reached (0 if none, see Explorer.ending_of) into
+    a state."""
+    return ending << 64 | node << 32 | flags
+
+
+def node_of(state):
+    """A function returning the node index of a state."""
+    return state >> 32 & _FLAGS
+
+
+def flags_of(state):
+    """A function returning the Player's flags of a state."""
+    return state & _FLAGS
+
+
+class Explorer:
+    """A class exploring the states of a story reachable from its first room.
+
+    Attributes:
+    -------------
+    story : Story
+        The explored story
+    start : int
+        The state the game begins in
+    transitions : dict
+        The ways out of every reachable state, as a tuple of (choice, state)
+        pairs, where choice is None if the Player is not asked
+    endings : dict
+        The ending of every state in which the game ends
+
+    Methods:
+    -------------
+    ending_of(state)
+    reachable_endings()
+    path_counts()
+    paths()
+    ending_probabilities(weight)
+    choice_outcomes()
+    unreachable()
+    """
+
+    def __init__(self, story, start='DarkRoom'):
+        self.story = story
+        self.start = state_of(story.find(start), 0)
+        self.transitions = {}
+        self.endings = {}
+        self._reached = [None]  # the endings reached, by number
+        self._explore()
+
+    def ending_of(self, state):
+        """A method returning the last ending reached before the node of
+        a state, None if there is none."""
+        return self._reached[state >> 64]
+
+    def _explore(self):
+        """A method finding all the states reachable from the start by
+        a breadth-first search."""
+        queue = deque([self.start])
+        self.transitions[self.start] = None
+        numbers = {None: 0}
+        while queue:
+            state = queue.popleft()
+            node = self.story.node(node_of(state))
+            flags = flags_of(state) | node.set_mask
+            ending = node.ending or self.ending_of(state)
+            if ending not in numbers:
+                numbers[ending] = len(self._reached)
+                self._reached.append(ending)
+            edges = [edge for edge in node.edges
+                     if flags & edge.require == edge.require
+                     and not flags & edge.forbid]
+            if node.prompt is None:
+                edges = edges[:1]
+            ways_out = tuple(
+                (edge.choice, None if edge.target == END
+                 else state_of(edge.target, flags, numbers[ending]))
+                for edge in edges)
+            if not ways_out or None in (state for _, state in ways_out):
+                self.endings[state] = ending or DEFAULT_ENDING
+            self.transitions[state] = ways_out
+            for _, next_state in ways_out:
+                if (next_state is not None
+                        and next_state not in self.transitions):
+                    self.transitions[next_state] = None
+                    queue.append(next_state)
+
+    def _order(self):
+        """A method returning the reachable states in topological order and
+        the set of states that cannot be ordered, because they lie on
+        a cycle or after one."""
+        incoming = Counter()
+        for ways_out in self.transitions.values():
+            for _, next_state in ways_out:
+                if next_state is not None:
+                    incoming[next_state] += 1
+        queue = deque(state for state in self.transitions
+                      if not incoming[state])
+        order = []
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for _, next_state in self.transitions[state]:
+                if next_state is not None:
+                    incoming[next_state] -= 1
+                    if not incoming[next_state]:
+                        queue.append(next_state)
+        cyclic = set(self.transitions) - set(order)
+        return order, cyclic
+
+    def reachable_endings(self):
+        """A method returning, for every state, the set of endings that can
+        still be reached from it."""
+        reachable = {state: set() for state in self.transitions}
+        predecessors = {state: set() for state in self.transitions}
+        work = deque()
+        for state, ways_out in self.transitions.items():
+            for _, next_state in ways_out:
+                if next_state is None:
+                    reachable[state].add(self.endings[state])
+                else:
+                    predecessors[next_state].add(state)
+            if not ways_out:
+                reachable[state].add(self.endings[state])
+            if reachable[state]:
+                work.append(state)
+        while work:
+            state = work.popleft()
+            for previous in predecessors[state]:
+                if not reachable[state] <= reachable[previous]:
+                    reachable[previous] |= reachable[state]
+                    work.append(previous)
+        return reachable
+
+    def path_counts(self):
+        """A method returning the number of distinct ways of reaching every
+        ending from the start, infinite if a cycle leads to the ending."""
+        order, cyclic = self._order()
+        counts = {state: Counter() for state in self.transitions}
+        reachable = self.reachable_endings()
+        for state in cyclic:
+            for ending in reachable[state]:
+                counts[state][ending] = float('inf')
+        for state in reversed(order):
+            ways_out = self.transitions[state]
+            if not ways_out:
+                counts[state][self.endings[state]] += 1
+            for _, next_state in ways_out:
+                if next_state is None:
+                    counts[state][self.endings[state]] += 1
+                else:
+                    counts[state].update(counts[next_state])
+        return dict(counts[self.start])
+
+    def paths(self):
+        """A generator yielding the distinct ways of playing the story, as
+        (answers, ending) pairs, where answers can be passed to simulate.
+        Cycles are followed once at most."""
+        stack = [(self.start, (), frozenset())]
+        while stack:
+            state, answers, seen = stack.pop()
+            ways_out = self.transitions[state]
+            if not ways_out:
+                yield answers, self.endings[state]
+            for choice, next_state in reversed(ways_out):
+                if choice is not None:
+                    next_answers = answers + (choice,)
+                else:
+                    next_answers = answers
+                if next_state is None:
+                    yield next_answers, self.endings[state]
+                elif next_state not in seen:
+                    stack.append((next_state, next_answers, seen | {state}))
+
+    def ending_probabilities(self, weight=None):
+        """A method returning the probability of every ending when the Player
+        answers at random. weight(node_name, choice) gives the relative chance
+        of each answer, all the answers are equally likely by default."""
+        order, cyclic = self._order()
+        chances = {}
+        for state, ways_out in self.transitions.items():
+            node = self.story.node(node_of(state))
+            weights = [weight(node.name, choice) if weight and choice else 1
+                       for choice, _ in ways_out]
+            total = sum(weights)
+            chances[state] = [(w / total, next_state) for w, (_, next_state)
+                              in zip(weights, ways_out) if w]
+        probabilities = {state: Counter() for state in self.transitions}
+
+        def update(state):
+            result = Counter()
+            if not chances[state]:
+                result[self.endings[state]] = 1.0
+            for chance, next_state in chances[state]:
+                if next_state is None:
+                    result[self.endings[state]] += chance
+                else:
+                    for ending, p in probabilities[next_state].items():
+                        result[ending] += chance * p
+            probabilities[state] = result
+
+        if not cyclic:
+            for state in reversed(order):
+                update(state)
+        else:
+            # Iterate until the probabilities around the cycles settle
+            states = list(reversed(order)) + list(cyclic)
+            for _ in range(10000):
+                before = {state: probabilities[state] for state in states}
+                for state in states:
+                    update(state)
+                if all(abs(probabilities[state][ending]
+                           - before[state][ending]) < 1e-12
+                       for state in states
+                       for ending in probabilities[state]):
+                    break
+        return dict(probabilities[self.start])
+
+    def choice_outcomes(self):
+        """A method returning, for every prompt, the endings still reachable
+        after each of its answers, as {node name: {answer: set of endings}}.
+        """
+        reachable = self.reachable_endings()
+        outcomes = {}
+        for state, ways_out in self.transitions.items():
+            node = self.story.node(node_of(state))
+            if node.prompt is None:
+                continue
+            answers = outcomes.setdefault(node.name, {})
+            for choice, next_state in ways_out:
+                endings = answers.setdefault(choice, set())
+                if next_state is None:
+                    endings.add(self.endings[state])
+                else:
+                    endings |= reachable[next_state]
+        return outcomes
+
+    def unreachable(self):
+        """A method returning the names of the nodes that can never be
+        reached and the ways out that can never be taken, as (node name,
+        target name) pairs."""
+        reached = {node_of(state) for state in self.transitions}
+        taken = set()
+        for state, ways_out in self.transitions.items():
+            for choice, next_state in ways_out:
+                target = END if next_state is None else node_of(next_state)
+                taken.add((node_of(state), choice, target))
+        nodes, edges = [], []
+        for index in range(self.story.node_count):
+            node = self.story.node(index)
+            if index not in reached:
+                nodes.append(node.name)
+                continue
+            for edge in node.edges:
+                if (index, edge.choice, edge.target) not in taken:
+                    target = ('end' if edge.target == END
+                              else self.story.node(edge.target).name)
+                    edges.append((node.name, target))
+        return nodes, edges
+
+
+def report(explorer, weight=None, path_limit=0):
+    """A function returning the text report of the exploration."""
+    story = explorer.story
+    lines = [f'{len(explorer.transitions)} reachable states, '
+             f'{len(explorer.endings)} of them ending the game', '',
+             'Ways of reaching the endings:']
+    for ending, count in sorted(explorer.path_counts().items()):
+        lines.append(f'  {ending}: {count}')
+    lines += ['', 'Ending probabilities:']
+    for ending, p in sorted(explorer.ending_probabilities(weight).items()):
+        lines.append(f'  {ending}: {p:.4f}')
+    lines += ['', 'Endings reachable after each answer:']
+    for name, answers in explorer.choice_outcomes().items():
+        lines.append(f'  {name}: {story.node(story.find(name)).prompt}')
+        for choice, endings in answers.items():
+            lines.append(f'    {choice} -> {", ".join(sorted(endings))}')
+    nodes, edges = explorer.unreachable()
+    lines += ['', 'Unreachable nodes:']
+    lines += [f'  {name}' for name in nodes] or ['  none']
+    lines += ['', 'Ways out that are never taken:']
+    lines += [f'  {name} -> {target}' for name, target in edges] or ['  none']
+    if path_limit:
+        lines += ['', 'Paths:']
+        for answers, ending in islice(explorer.paths(), path_limit):
+            lines.append(f'  {" ".join(answers)}: {ending}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Parse the command line options and print the report."""
+    parser = argparse.ArgumentParser(description='Explore all the ways a '
+                                                 'story can be played.')
+    parser.add_argument('story', nargs='?', default=STORY_PATH)
+    parser.add_argument('--start', default='DarkRoom',
+                        help='the room the game begins in')
+    parser.add_argument('--weights', type=json.loads, default=None,
+                        help='relative chances of the answers as JSON, e.g. '
+                             '\'{"yes": 2}\', the others have 1')
+    parser.add_argument('--paths', type=int, default=0, metavar='N',
+                        help='list up to N paths')
+    args = parser.parse_args(argv)
+
+    def weight_of(node_name, choice):
+        return args.weights.get(choice, 1)
+
+    weight = weight_of if args.weights else None
+    explorer = Explorer(load_story(args.story), args.start)
+    print(report(explorer, weight, args.paths))
+
+
+if __name__ == '__main__':
+    main()
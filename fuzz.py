@@ -0,0 +1,349 @@
+#!/usr/bin/python3
+"""A fuzzer of the game's prompts. It plays games from the entrance of every
+room, with random flags, answering the questions with generated input:
+the valid answers, the answers padded with whitespace, garbage, random
+Unicode, control characters, huge lines and the end of the input. All the
+games run in-process: either in the game engine with a console that does no
+input or output, or in a server Session whose input is fed to its stream
+reader as bytes.
+
+A game fails when it raises anything but EOFError at the end of its input
+(a crash), runs for longer than a time limit or prints too many messages
+without asking anything (a hang). The inputs of every new failure are
+shrunk to a minimal sequence reproducing it.
+
+Usage:
+
+    python fuzz.py [--seconds 60] [--seed N] [--max-inputs 40]
+"""
+
+import argparse
+import asyncio
+import random
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+import adventure_game
+from adventure_game import (InstantSink, Player, Room, ScriptedConsole,
+                            TextCache)
+from server import Session, SessionClosed
+
+HUGE_LINES = ('x' * (1 << 20), 'é☃' * (1 << 18), ' ' * (1 << 16))
+CONTROL = ('\x00', '\x1b[2J', '\r', '\x04', '\x7f', '\t', '\ufeff')
+
+Failure = namedtuple('Failure', ['kind', 'error', 'where'])
+Failure.__doc__ = """A way a game has gone wrong.
+
+Attributes:
+-------------
+kind : str
+    'crash' or 'hang'
+error : str
+    The exception and its message
+where : str
+    The file and line the exception was raised at
+"""
+
+Reproducer = namedtuple('Reproducer', ['failure', 'target', 'room', 'flags',
+                                       'inputs'])
+Reproducer.__doc__ = """A shrunk game reproducing a failure.
+
+Attributes:
+-------------
+failure : Failure
+    The failure
+target : str
+    What played the game, 'engine' or 'session' (see TARGETS)
+room : str
+    The room the game starts in
+flags : int
+    The Player's flags at the start, as a bitfield
+inputs : tuple
+    The input of the game, the input ends after the last one
+"""
+
+
+class Hang(Exception):
+    """A game has run for too long or printed too much without asking
+    anything."""
+
+
+class FuzzConsole(ScriptedConsole):
+    """A child class of ScriptedConsole, raising Hang when too many messages
+    are printed without any input read in between.
+
+    Attributes:
+    -------------
+    limit : int
+        The number of messages allowed between two inputs
+
+    Methods:
+    -------------
+    write(text)
+    read(prompt)
+    """
+
+    shows_text = True  # the messages are counted
+
+    def __init__(self, inputs, limit=1000):
+        super().__init__(inputs)
+        self.limit = limit
+        self._printed = 0
+
+    def write(self, text):
+        self._printed += 1
+        if self._printed > self.limit:
+            raise Hang(f'{self._printed} messages without a question')
+
+    def read(self, prompt):
+        self._printed = 0
+        return super().read(prompt)
+
+
+@contextmanager
+def deadline(seconds):
+    """A context manager raising Hang in the block if it runs for longer than
+    the given number of seconds. Only available in the main thread of a Unix
+    process, elsewhere the block is not limited."""
+    if (not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signal_number, frame):
+        raise Hang(f'still running after {seconds} s')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def run(room, flags, inputs, limit=1000, seconds=1.0):
+    """A function playing a game from the entrance of a room with the given
+    flags, answering with the inputs. Returns None if the game ends or runs
+    out of input, otherwise its Failure."""
+    previous = adventure_game.console
+    adventure_game.console = FuzzConsole(inputs, limit)
+    player = Player(Room.named(room), 'Fuzz')
+    player.flags = flags
+    try:
+        with deadline(seconds):
+            adventure_game.game_engine(player)
+    except EOFError:
+        return None
+    except Exception as error:
+        frame = traceback.extract_tb(error.__traceback__)[-1]
+        return Failure('hang' if isinstance(error, Hang) else 'crash',
+                       f'{type(error).__name__}: {str(error)[:200]}',
+                       f'{frame.filename}:{frame.lineno}')
+    finally:
+        adventure_game.console = previous
+    return None
+
+
+class NullWriter:
+    """A class standing for the stream a server Session writes to, throwing
+    the output away.
+
+    Methods:
+    -------------
+    write(data)
+    drain()
+    close()
+    is_closing()
+    """
+
+    def __init__(self):
+        self._closed = False
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self._closed = True
+
+    def is_closing(self):
+        return self._closed
+
+
+@lru_cache(maxsize=256)  # the huge lines come back again and again
+def _encode(text):
+    return (text + '\n').encode('utf-8', 'surrogatepass')
+
+
+def run_session(room, flags, inputs, limit=1000, seconds=1.0):
+    """A function playing a game like run, in a server Session reading the
+    inputs as lines of UTF-8 (lone surrogates included) from its stream
+    reader. Returns None if the game ends or runs out of input, otherwise
+    its Failure."""
+    async def play():
+        reader = asyncio.StreamReader()
+        for text in inputs:
+            reader.feed_data(_encode(text))
+        reader.feed_eof()
+        session = Session(reader, NullWriter(),
+                          InstantSink(cache=TextCache(width=0)))
+        player = Player(Room.named(room), 'Fuzz')
+        player.flags = flags
+        try:
+            await asyncio.wait_for(session.play(player), seconds)
+        except SessionClosed:
+            pass
+        except asyncio.TimeoutError:
+            raise Hang(f'still running after {seconds} s') from None
+
+    global _loop
+    if _loop is None:  # one loop for all the games, it is costly to set up
+        _loop = asyncio.new_event_loop()
+    try:
+        _loop.run_until_complete(play())
+    except Exception as error:
+        frame = traceback.extract_tb(error.__traceback__)[-1]
+        return Failure('hang' if isinstance(error, Hang) else 'crash',
+                       f'{type(error).__name__}: {str(error)[:200]}',
+                       f'{frame.filename}:{frame.lineno}')
+    return None
+
+
+_loop = None
+TARGETS = {'engine': run, 'session': run_session}
+
+
+def answers_of(story):
+    """A function returning all the answers to the questions of a story."""
+    answers = set()
+    for index in range(story.node_count):
+        answers.update(edge.choice for edge in story.node(index).edges
+                       if edge.choice is not None)
+    return sorted(answers)
+
+
+def generate(rng, answers, max_inputs):
+    """A function returning a random sequence of inputs."""
+    inputs = []
+    for _ in range(rng.randrange(max_inputs + 1)):
+        kind = rng.random()
+        if kind < 0.4:
+            text = rng.choice(answers)
+        elif kind < 0.5:
+            text = rng.choice(('', ' ', '\t')) + rng.choice(answers) + ' '
+        elif kind < 0.65:
+            text = ''.join(chr(rng.randrange(32, 127))
+                           for _ in range(rng.randrange(20)))
+        elif kind < 0.8:
+            text = ''.join(chr(rng.randrange(0x110000))
+                           for _ in range(rng.randrange(1, 8)))
+        elif kind < 0.9:
+            text = rng.choice(CONTROL) + rng.choice(answers)
+        elif kind < 0.95:
+            text = rng.choice(HUGE_LINES)
+        else:
+            text = rng.choice(answers).upper()
+        inputs.append(text)
+    return inputs
+
+
+def shrink(fails, inputs):
+    """A function shrinking a sequence of inputs for which fails(inputs) is
+    True: first by removing ever smaller chunks of it, then by simplifying
+    the inputs left. Returns the shortest sequence found."""
+    inputs = list(inputs)
+    chunk = max(1, len(inputs) // 2)
+    while chunk:
+        start = 0
+        while start < len(inputs):
+            candidate = inputs[:start] + inputs[start + chunk:]
+            if fails(candidate):
+                inputs = candidate
+            else:
+                start += chunk
+        chunk //= 2
+    for number, text in enumerate(inputs):
+        for simpler in ('', text[:1], text.strip(), text[:len(text) // 2]):
+            if len(simpler) < len(text):
+                candidate = inputs[:number] + [simpler] + inputs[number + 1:]
+                if fails(candidate):
+                    inputs = candidate
+                    break
+    return inputs
+
+
+def fuzz(seconds=60.0, seed=None, max_inputs=40, report=None):
+    """A function playing fuzzed games for the given number of seconds.
+    Returns the Reproducers of the distinct failures found and the numbers of
+    games played and inputs given. report(reproducer) is called for every
+    new failure."""
+    story = adventure_game.story
+    rng = random.Random(seed)
+    answers = answers_of(story)
+    rooms = sorted({story.node(index).room
+                    for index in range(story.node_count)})
+    failures = {}
+    games = inputs_given = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        target = rng.choice(sorted(TARGETS))
+        play = TARGETS[target]
+        room = rng.choice(rooms)
+        flags = rng.getrandbits(len(story.flags)) if story.flags else 0
+        inputs = generate(rng, answers, max_inputs)
+        failure = play(room, flags, inputs)
+        games += 1
+        inputs_given += len(inputs)
+        if failure is None or failure in failures:
+            continue
+        if flags and play(room, 0, inputs) == failure:
+            flags = 0
+        inputs = shrink(lambda candidate: play(room, flags,
+                                               candidate) == failure, inputs)
+        failures[failure] = Reproducer(failure, target, room, flags,
+                                       tuple(inputs))
+        if report:
+            report(failures[failure])
+    return list(failures.values()), games, inputs_given
+
+
+def _describe(reproducer):
+    inputs = ', '.join(repr(text) if len(text) < 40
+                       else f'{text[:20]!r}... ({len(text)} characters)'
+                       for text in reproducer.inputs)
+    failure = reproducer.failure
+    return (f'{failure.kind}: {failure.error} at {failure.where}\n'
+            f'  {reproducer.target}, room {reproducer.room}, '
+            f'flags {reproducer.flags:#x}, '
+            f'inputs [{inputs}]')
+
+
+def main(argv=None):
+    """Parse the command line options, fuzz the game and print the failures
+    found."""
+    parser = argparse.ArgumentParser(description='Fuzz the prompts of the '
+                                                 'game.')
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-inputs', type=int, default=40,
+                        help='the longest sequence of inputs of a game')
+    args = parser.parse_args(argv)
+    failures, games, inputs = fuzz(args.seconds, args.seed, args.max_inputs,
+                                   lambda found: print(_describe(found)))
+    print(f'{games} games, {inputs} inputs '
+          f'({inputs / args.seconds * 60:.0f} per minute), '
+          f'{len(failures)} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""An index of hints for the Player: for every question of the story and
+every set of flags (and last ending reached) the Player can have when it is
+asked, the answer that keeps the happy ending reachable in the fewest
+answers, and how many answers away the ending then is.
+
+The index is worked out once from all the states of the story explored by
+an Explorer, going backwards from the states that end happily, so a hint is
+a single lookup however large the story grows.
+"""
+
+from collections import deque, namedtuple
+
+from explorer import flags_of, node_of
+
+HAPPY_END = 'HAPPY END'
+
+Hint = namedtuple('Hint', ['choice', 'steps'])
+Hint.__doc__ = """The best answer to a question.
+
+Attributes:
+-------------
+choice : str
+    The answer keeping the ending reachable in the fewest answers
+steps : int
+    The number of answers up to the ending, that one included
+"""
+
+
+class HintIndex:
+    """A class keeping the best answer to every question of a story, for
+    every set of flags and last ending reached the Player can have at the
+    question.
+
+    Attributes:
+    -------------
+    goal : str
+        The ending the hints lead to
+    hints : dict
+        The Hint of every question from which the goal can be reached, by
+        node index, the Player's flags and the last ending reached at the
+        question
+
+    Methods:
+    -------------
+    lookup(node, flags, ending)
+    advice(node, flags, ending)
+    """
+
+    def __init__(self, explorer, goal=HAPPY_END):
+        self.goal = goal
+        self.hints = {}
+        self._build(explorer)
+
+    def _distances(self, explorer):
+        """A method returning the fewest answers from every state to the goal,
+        by a breadth-first search backwards from the states ending with it,
+        in which only the answers to questions count as a step."""
+        predecessors = {state: [] for state in explorer.transitions}
+        distances = {}
+        queue = deque()
+        for state, ways_out in explorer.transitions.items():
+            for choice, next_state in ways_out:
+                if next_state is not None:
+                    predecessors[next_state].append(
+                        (state, int(choice is not None)))
+            if explorer.endings.get(state) == self.goal:
+                steps = min((int(choice is not None)
+                             for choice, next_state in ways_out
+                             if next_state is None), default=0)
+                distances[state] = steps
+                queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for previous, step in predecessors[state]:
+                steps = distances[state] + step
+                if steps < distances.get(previous, steps + 1):
+                    distances[previous] = steps
+                    if step:
+                        queue.append(previous)
+                    else:
+                        queue.appendleft(previous)
+        return distances
+
+    def _build(self, explorer):
+        distances = self._distances(explorer)
+        for state, ways_out in explorer.transitions.items():
+            node = explorer.story.node(node_of(state))
+            if node.prompt is None:
+                continue
+            best = None
+            for choice, next_state in ways_out:
+                if next_state is None:
+                    if explorer.endings[state] != self.goal:
+                        continue
+                    steps = 1
+                elif next_state in distances:
+                    steps = 1 + distances[next_state]
+                else:
+                    continue
+                if best is None or steps < best.steps:
+                    best = Hint(choice, steps)
+            if best is not None:
+                self.hints[node_of(state),
+                           flags_of(state) | node.set_mask,
+                           node.ending or explorer.ending_of(state)] = best
+
+    def lookup(self, node, flags, ending=None):
+        """A method returning the Hint for the question of a node with the
+        Player's flags and last ending reached, None if the goal cannot be
+        reached any more."""
+        return self.hints.get((node, flags, ending))
+
+    def advice(self, node, flags, ending=None):
+        """A method returning the hint for the question of a node with the
+        Player's flags and last ending reached, as a message for the
+        Player."""
+        hint = self.lookup(node, flags, ending)
+        if hint is None:
+            return (f'No answer leads to the {self.goal} from here any more. '
+                    f'Whatever you choose, good luck!')
+        answers = 'answer' if hint.steps == 1 else 'answers'
+        return (f'Hint: answer "{hint.choice}". The {self.goal} is '
+                f'{hint.steps} {answers} away.')
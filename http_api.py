@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+"""An HTTP API playing the game one step at a time, e.g.
+
+    python http_api.py --port 8080 --secret s3cret
+    curl -d '{"name": "Zed"}' localhost:8080/start
+    curl -d '{"token": "...", "choice": "2"}' localhost:8080/answer
+
+The server keeps no state of the games. Every response carries a token
+holding the Player's whole state (name, flags and position in the story),
+signed with the secret so that it cannot be forged, and the next request
+sends the token back. Any worker knowing the secret can answer any request,
+so the workers can be put behind a plain load balancer.
+
+Both requests answer with the messages up to the next question:
+
+    {"messages": [...], "prompt": "Go left (1) or right (2)?",
+     "choices": ["1", "2"], "ending": null, "token": "..."}
+
+At the end of the game prompt and token are null and ending is set.
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import adventure_game
+from adventure_game import DarkRoom, Player, Prompt, play_rooms
+from saves import Snapshot
+from story import DEFAULT_ENDING
+
+MAX_BODY = 1 << 16
+
+_STATE = struct.Struct('<HIII')  # cursor, node, flags, story checksum
+_SIGNATURE_SIZE = 16
+
+
+class TokenError(ValueError):
+    """The token is forged, damaged or made for another story."""
+
+
+def _sign(secret, data):
+    return hmac.new(secret, data, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def encode_token(secret, player):
+    """A function returning the signed token of the Player's state, as
+    a URL-safe string."""
+    node, cursor = player.position
+    data = _STATE.pack(cursor, node, player.flags,
+                       adventure_game.story.checksum)
+    data += player.name.encode('utf-8')[:255]
+    return base64.urlsafe_b64encode(_sign(secret, data) + data).decode(
+        'ascii').rstrip('=')
+
+
+def decode_token(secret, token):
+    """A function checking a token and returning the state it holds, as
+    a Snapshot. Raises TokenError if the token is not valid."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise TokenError('the token is damaged') from None
+    signature, data = raw[:_SIGNATURE_SIZE], raw[_SIGNATURE_SIZE:]
+    if (len(data) < _STATE.size
+            or not hmac.compare_digest(signature, _sign(secret, data))):
+        raise TokenError('the token is not valid')
+    cursor, node, flags, story = _STATE.unpack_from(data)
+    if story != adventure_game.story.checksum:
+        raise TokenError('the token was made for another story')
+    name = data[_STATE.size:].decode('utf-8', 'replace')
+    return Snapshot('', name, node, cursor, flags, story)
+
+
+def step(player, choice=None):
+    """A function playing the game from the Player's position up to the next
+    question or the end of the game. If choice is given, it is the answer to
+    the question the Player is at. Returns the messages and the next question
+    (Prompt, None at the end of the game). Raises ValueError if the choice is
+    not one of the answers to the question."""
+    messages = []
+    events = play_rooms(player)
+    try:
+        event = next(events)
+        if choice is not None:
+            # The question the Player is at is asked again first
+            while not isinstance(event, Prompt):
+                event = next(events)
+            if choice not in event.choices:
+                raise ValueError(f'{choice!r} is not one of the answers')
+            event = events.send(choice)
+        while not isinstance(event, Prompt):
+            messages.append(event)
+            event = next(events)
+        return messages, event
+    except StopIteration:
+        return messages, None
+
+
+def play(secret, request):
+    """A function answering a request of the API, a dict with either the name
+    of a new Player or a token and a choice. Returns the response, a dict."""
+    if 'token' in request:
+        player = Player.resume(decode_token(secret, str(request['token'])))
+        messages, prompt = step(player, str(request.get('choice', '')))
+    else:
+        player = Player(DarkRoom, str(request.get('name') or 'Player'))
+        messages, prompt = step(player)
+    return {'messages': messages,
+            'prompt': prompt.text if prompt else None,
+            'choices': list(prompt.choices) if prompt else [],
+            'ending': None if prompt else player.ending or DEFAULT_ENDING,
+            'token': encode_token(secret, player) if prompt else None}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """A class handling the HTTP requests: POST /start and POST /answer, with
+    a JSON body."""
+
+    secret = b''
+
+    def do_POST(self):
+        if self.path not in ('/start', '/answer'):
+            self._respond(404, {'error': 'no such endpoint'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError('the Content-Length is negative')
+            if length > MAX_BODY:
+                raise ValueError('the request is too large')
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('the request is not a JSON object')
+            if self.path == '/answer' and 'token' not in request:
+                raise ValueError('the token is missing')
+            if self.path == '/start':
+                request.pop('token', None)
+            response = play(self.secret, request)
+        except TokenError as error:
+            self._respond(403, {'error': str(error)})
+        except ValueError as error:
+            self._respond(400, {'error': str(error)})
+        else:
+            self._respond(200, response)
+
+    def _respond(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    """Parse the command line options and serve the API until
+    interrupted."""
+    parser = argparse.ArgumentParser(description='Serve the adventure game '
+                                                 'over an HTTP API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--secret', default=os.environ.get('ADVENTURE_SECRET'),
+                        help='the secret the tokens are signed with, the same '
+                             'for all the workers (ADVENTURE_SECRET by '
+                             'default)')
+    parser.add_argument('--story', default=adventure_game.STORY_PATH,
+                        help='the story to play, in the text or compiled '
+                             'form')
+    args = parser.parse_args(argv)
+    if not args.secret:
+        parser.error('a secret is needed, with --secret or ADVENTURE_SECRET')
+    adventure_game.use_story(args.story)
+    Handler.secret = args.secret.encode('utf-8')
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
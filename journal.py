@@ -0,0 +1,153 @@
+"""Journals of the games: every room entered, every answer given and every
+flag set, so that any game can be replayed exactly as it was played.
+
+A journal is a file of JSON lines, one record per event:
+
+    {"game": "...", "event": "start", "name": "Zed", "room": "DarkRoom",
+     "node": null, "cursor": 0, "flags": [], "story": 123456789, ...}
+    {"game": "...", "event": "room", "room": "DarkRoom", "flags": [], ...}
+    {"game": "...", "event": "choice", "node": "DarkRoom", "prompt": "...",
+     "choice": "2", "flags": [], ...}
+    {"game": "...", "event": "end", "ending": "HAPPY END",
+     "flags": ["has_bottle", "has_key"], ...}
+
+The flags of a record are the flags set since the previous record of the
+game. Many games can be written to the same journal at once, the records of
+a game are told apart by its game id. Records are written with a single
+write each and never rewritten, the same way as the saves.
+"""
+
+import json
+import os
+import time
+from collections import defaultdict
+from itertools import count
+
+from story import DEFAULT_ENDING
+
+IGNORED = ('game', 'time', 'story')  # not compared by a replay
+
+_ids = count()
+
+
+class Journal:
+    """A class appending the records of the games to a journal file.
+
+    Attributes:
+    -------------
+    path : str
+        The path of the journal
+    story : Story
+        The story the games are played with
+
+    Methods:
+    -------------
+    start(player)
+    write(record)
+    close()
+    """
+
+    def __init__(self, path, story):
+        self.path = path
+        self.story = story
+        self._file = open(path, 'ab', buffering=0)
+
+    def start(self, player):
+        """A method starting the journal of the Player's game, from the
+        Player's current position."""
+        game = f'{os.getpid()}-{int(time.time() * 1000)}-{next(_ids)}'
+        player.journal = Recording(self.write, self.story, game, player)
+
+    def write(self, record):
+        """A method appending a record to the journal."""
+        record['time'] = time.time()
+        self._file.write(json.dumps(record).encode('utf-8') + b'\n')
+
+    def close(self):
+        """A method closing the journal."""
+        self._file.close()
+
+
+class Recording:
+    """A class recording the events of a single game.
+
+    Attributes:
+    -------------
+    game : str
+        The id of the game
+    records : list
+        The records written so far, only kept if write is None
+
+    Methods:
+    -------------
+    room(player)
+    choice(player, prompt, choice)
+    end(player)
+    """
+
+    __slots__ = ('_write', '_story', 'game', '_flags', 'records')
+
+    def __init__(self, write, story, game, player):
+        self.records = [] if write is None else None
+        self._write = write or self.records.append
+        self._story = story
+        self.game = game
+        self._flags = 0
+        position = player.position
+        node, cursor = position if position else (None, 0)
+        room = player._current_room or player._next_room
+        self._record(player, 'start', name=player.name, room=room._room_name,
+                     node=None if node is None else story.node(node).name,
+                     cursor=cursor, story=story.checksum)
+
+    def _record(self, player, event, **fields):
+        record = {'game': self.game, 'event': event}
+        record.update(fields)
+        gained = player.flags & ~self._flags
+        self._flags = player.flags
+        record['flags'] = [flag for bit, flag in enumerate(self._story.flags)
+                           if gained >> bit & 1]
+        self._write(record)
+
+    def room(self, player):
+        """A method recording the Player entering a room."""
+        self._record(player, 'room', room=player._current_room._room_name)
+
+    def choice(self, player, prompt, choice):
+        """A method recording the Player's answer to a question."""
+        node = self._story.node(player.position[0]).name
+        self._record(player, 'choice', node=node, prompt=prompt,
+                     choice=choice)
+
+    def end(self, player):
+        """A method recording the end of the game."""
+        self._record(player, 'end', ending=player.ending or DEFAULT_ENDING)
+
+
+def load(path):
+    """A function reading a journal. Returns the records of every game, by
+    game id, in the order the games started."""
+    games = defaultdict(list)
+    with open(path, 'rb') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a record cut short by a crash
+            games[record['game']].append(record)
+    return dict(games)
+
+
+def first_difference(expected, actual):
+    """A function comparing the records of two plays of a game, apart from
+    the fields that may differ between the plays (IGNORED). Returns the
+    number of the first record that differs and the two records (None past
+    the end of the shorter play), or None if the plays are the same."""
+    for number in range(max(len(expected), len(actual))):
+        records = [None if number >= len(play) else
+                   {key: value for key, value in play[number].items()
+                    if key not in IGNORED}
+                   for play in (expected, actual)]
+        if records[0] != records[1]:
+            return (number, *records)
+    return None
@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+"""A load generator playing many games at once with the real game, each one
+a copy of adventure_game.py run under its own pseudo-terminal, the way
+a Player runs it. Every copy is answered the way a Player would: its name
+at "Name yor character: ", ENTER at every "...", and one of the choices at
+every question, either along a script or at random.
+
+The number of games played at once is ramped up level by level; at every
+level the tool measures the time from starting the game to its first
+output, the time the game takes to respond to every answer (until it waits
+for the Player again) and the time of the whole game, and reports where the
+number of games finished per second stops growing.
+
+Usage:
+
+    python loadgen.py [--concurrency 1 2 4 8 16] [--duration 10]
+                      [--script answers.jsonl | --random] [--think 0]
+"""
+
+import argparse
+import codecs
+import fcntl
+import json
+import os
+import pty
+import random
+import selectors
+import struct
+import subprocess
+import sys
+import termios
+import time
+
+import adventure_game
+from explorer import Explorer
+
+GAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    'adventure_game.py')
+NAME_PROMPT = 'Name yor character: '
+PAUSE_PROMPT = '\n ...'
+WINDOW_SIZE = (24, 80)  # rows and columns of the pseudo-terminals
+
+
+def prompts_of(story):
+    """A function returning the choices of every question of a story, by the
+    question's text."""
+    prompts = {}
+    for index in range(story.node_count):
+        node = story.node(index)
+        if node.prompt is not None:
+            prompts.setdefault(node.prompt, set()).update(
+                edge.choice for edge in node.edges if edge.choice is not None)
+    return {prompt: sorted(choices) for prompt, choices in prompts.items()}
+
+
+def percentile(values, share):
+    """A function returning the value below which the given share of the
+    values lie (nearest rank), None if there are no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(share * len(values)) - 1))]
+
+
+class Session:
+    """A class playing one game under a pseudo-terminal and timing it.
+
+    Attributes:
+    -------------
+    process : Popen
+        The game
+    fd : int
+        The master side of the game's pseudo-terminal
+    answers : iterator
+        The answers to the questions, random choices once it is exhausted
+    started : float
+        The time the game was started at
+    first_output : float
+        The time from the start to the first output, None until then
+    latencies : list
+        The times the game took to respond to the answers, in seconds
+    finished : float
+        The time of the whole game, None until the game has ended
+
+    Methods:
+    -------------
+    feed(data, now)
+    answer_due(now)
+    end(now)
+    kill()
+    """
+
+    def __init__(self, command, prompts, answers, rng, think=0.0,
+                 name='Load'):
+        self.prompts = prompts
+        self.answers = iter(answers)
+        self.rng = rng
+        self.think = think
+        self.name = name
+        self.fd, slave = pty.openpty()
+        fcntl.ioctl(slave, termios.TIOCSWINSZ,
+                    struct.pack('HHHH', *WINDOW_SIZE, 0, 0))
+        try:
+            self.process = subprocess.Popen(command, stdin=slave,
+                                            stdout=slave, stderr=slave,
+                                            start_new_session=True)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        finally:
+            os.close(slave)
+        self.started = time.perf_counter()
+        self.first_output = None
+        self.latencies = []
+        self.finished = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._tail = ''
+        self._sent = None  # when the last answer was sent
+        self._reply = None  # the next answer and when it is due
+
+    def _choose(self, prompt):
+        choices = self.prompts[prompt]
+        for answer in self.answers:
+            return answer
+        return self.rng.choice(choices)
+
+    def feed(self, data, now):
+        """A method taking the output of the game, and preparing the answer
+        once the game waits for the Player."""
+        if self.first_output is None:
+            self.first_output = now - self.started
+        self._tail = (self._tail + self._decoder.decode(data))[-512:]
+        if self._tail.endswith(NAME_PROMPT):
+            reply = self.name + '\n'
+        elif self._tail.endswith(PAUSE_PROMPT):
+            reply = '\n'
+        else:
+            prompt = next((prompt for prompt in self.prompts
+                           if self._tail.endswith(prompt)), None)
+            if prompt is None:
+                return
+            reply = self._choose(prompt) + '\n'
+        if self._sent is not None:
+            self.latencies.append(now - self._sent)
+            self._sent = None
+        self._tail = ''
+        self._reply = (reply, now + self.think)
+
+    def answer_due(self, now):
+        """A method sending the prepared answer if it is due. Returns the time
+        it is due at, None if there is no answer waiting."""
+        if self._reply is None:
+            return None
+        reply, due = self._reply
+        if due > now:
+            return due
+        self._reply = None
+        self._sent = time.perf_counter()
+        os.write(self.fd, reply.encode('utf-8'))
+        return None
+
+    def end(self, now):
+        """A method closing the pseudo-terminal of the game that has ended.
+        Returns the exit status of the game."""
+        self.finished = now - self.started
+        os.close(self.fd)
+        return self.process.wait()
+
+    def kill(self):
+        """A method stopping the game."""
+        self.process.kill()
+        self.process.wait()
+        os.close(self.fd)
+
+
+def run_level(concurrency, duration, command, prompts, scripts, rng,
+              think=0.0, timeout=60.0):
+    """A function keeping the given number of games running for duration
+    seconds, and waiting for the last ones to end. Returns a dict with the
+    measurements."""
+    selector = selectors.DefaultSelector()
+    results = {'concurrency': concurrency, 'sessions': 0, 'failures': 0,
+               'first_output': [], 'latency': [], 'session': []}
+    running = []
+    start = time.perf_counter()
+    end = start + duration
+
+    def spawn():
+        session = Session(command, prompts, rng.choice(scripts), rng, think,
+                          f'Load{results["sessions"] + len(running)}')
+        selector.register(session.fd, selectors.EVENT_READ, session)
+        running.append(session)
+
+    def finish(session, now):
+        selector.unregister(session.fd)
+        running.remove(session)
+        results['sessions'] += 1
+        if session.end(now):
+            results['failures'] += 1
+        else:
+            results['first_output'].append(session.first_output)
+            results['latency'] += session.latencies
+            results['session'].append(session.finished)
+
+    try:
+        while True:
+            now = time.perf_counter()
+            while now < end and len(running) < concurrency:
+                spawn()
+            if not running:
+                break
+            due = [session.answer_due(now) for session in running]
+            due = [when for when in due if when is not None]
+            wait = min(due) - now if due else 1.0
+            for key, _ in selector.select(max(0.0, wait)):
+                session = key.data
+                now = time.perf_counter()
+                try:
+                    data = os.read(session.fd, 65536)
+                except OSError:  # EIO: the game has ended and closed its side
+                    data = b''
+                if data:
+                    session.feed(data, now)
+                    session.answer_due(now)
+                else:
+                    finish(session, now)
+            now = time.perf_counter()
+            for session in [session for session in running
+                            if now - session.started > timeout]:
+                selector.unregister(session.fd)
+                running.remove(session)
+                session.kill()
+                results['sessions'] += 1
+                results['failures'] += 1
+    finally:
+        for session in running:
+            session.kill()
+        selector.close()
+    results['elapsed'] = time.perf_counter() - start
+    return results
+
+
+def saturation(levels):
+    """A function returning the level at which the games finished per second
+    stop growing: the lowest one within 10% of the best, and if it is the
+    highest level tried."""
+    best = max(level['sessions'] / level['elapsed'] for level in levels)
+    for level in levels:
+        if level['sessions'] / level['elapsed'] >= 0.9 * best:
+            return level, level is levels[-1]
+
+
+def report(levels):
+    """A function returning the text report of a ramp."""
+    def spread(values, scale):
+        marks = [percentile(values, share) for share in (0.5, 0.95, 0.99)]
+        return ' '.join('      -' if mark is None else f'{mark * scale:7.1f}'
+                        for mark in marks)
+
+    marks = ' '.join(f'{mark:>7}' for mark in ('p50', 'p95', 'p99'))
+    lines = [f'{"games":>5} {"ended":>6} {"failed":>6} {"per s":>7}  '
+             f'{"first output ms":^23}  {"response ms":^23}  '
+             f'{"whole game ms":^23}',
+             f'{"":27}  {marks}  {marks}  {marks}']
+    for level in levels:
+        lines.append(f'{level["concurrency"]:5} {level["sessions"]:6} '
+                     f'{level["failures"]:6} '
+                     f'{level["sessions"] / level["elapsed"]:7.2f}  '
+                     f'{spread(level["first_output"], 1000)}  '
+                     f'{spread(level["latency"], 1000)}  '
+                     f'{spread(level["session"], 1000)}')
+    level, last = saturation(levels)
+    rate = level['sessions'] / level['elapsed']
+    if last:
+        lines.append(f'\nNot saturated: {rate:.2f} games per second at '
+                     f'{level["concurrency"]} games at once, the most tried')
+    else:
+        lines.append(f'\nSaturated at {level["concurrency"]} games at once: '
+                     f'{rate:.2f} games per second, more games at once only '
+                     f'wait longer')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Parse the command line options, ramp the load up and print the
+    report."""
+    parser = argparse.ArgumentParser(description='Play many games at once '
+                                                 'under pseudo-terminals and '
+                                                 'measure their latency.')
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16, 32],
+                        help='the numbers of games played at once, in turn')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='the seconds new games are started for at '
+                             'every level')
+    parser.add_argument('--script', metavar='PATH',
+                        help='the answers of the games, a JSON list per line; '
+                             'all the ways of playing the story by default')
+    parser.add_argument('--random', action='store_true',
+                        help='answer every question at random')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='the seconds the Players take to answer')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='the seconds after which a game is stopped and '
+                             'counted as failed')
+    parser.add_argument('--text', choices=sorted(adventure_game.SINKS),
+                        default='instant',
+                        help='the way the games print the narrative text')
+    parser.add_argument('--line-input', action='store_true',
+                        help='run the games with --line-input')
+    parser.add_argument('--story', default=adventure_game.STORY_PATH)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    adventure_game.use_story(args.story)
+    story = adventure_game.story
+    if args.random:
+        scripts = [()]
+    elif args.script:
+        with open(args.script) as file:
+            scripts = [json.loads(line) for line in file if line.strip()]
+    else:
+        scripts = [answers for answers, _ in Explorer(story).paths()]
+    command = [sys.executable, GAME, '--text', args.text,
+               '--story', args.story]
+    if args.line_input:
+        command.append('--line-input')
+    prompts = prompts_of(story)
+    rng = random.Random(args.seed)
+    levels = []
+    try:
+        for concurrency in args.concurrency:
+            levels.append(run_level(concurrency, args.duration, command,
+                                    prompts, scripts, rng, args.think,
+                                    args.timeout))
+            print(f'{concurrency} games at once: {levels[-1]["sessions"]} '
+                  f'played', file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    if levels:
+        print(report(levels))
+
+
+if __name__ == '__main__':
+    main()
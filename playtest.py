@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""A playtester playing the game many times over with a choice policy, to
+measure how the story is balanced: how often each ending is reached, which
+ways through the rooms are taken and how long the games are.
+
+The games run through the rooms' own stories (Room.events), answering every
+question with one of the choices the room offers, so new rooms and questions
+are picked up without any changes here. The games are spread over a pool of
+processes, one per core by default.
+
+Usage:
+
+    python playtest.py [--policy uniform|weighted|greedy] [--runs 1000000]
+                       [--weights '{"yes": 2}'] [--processes N] [--seed N]
+"""
+
+import argparse
+import json
+import os
+import random
+from collections import Counter
+from multiprocessing import Pool
+
+import adventure_game
+from adventure_game import DarkRoom, Player, drive, play_rooms
+from explorer import Explorer, flags_of, node_of
+from story import DEFAULT_ENDING
+
+GOALS = ('has_key', 'has_bottle')  # what the greedy policy goes for
+
+
+def uniform(player, prompt, rng):
+    """A policy choosing every answer with the same chance."""
+    return rng.choice(prompt.choices)
+
+
+def weighted(weights):
+    """A function returning a policy choosing the answers with the given
+    relative chances, by answer (1 for the answers not given)."""
+    def policy(player, prompt, rng):
+        return rng.choices(prompt.choices,
+                           [weights.get(choice, 1)
+                            for choice in prompt.choices])[0]
+    return policy
+
+
+def greedy(goals=GOALS):
+    """A function returning a policy choosing the answers after which the
+    Player can still obtain the most of the goals (flags), at random among
+    equally good answers. The chances are worked out from all the states of
+    the story by an Explorer."""
+    story = adventure_game.story
+    explorer = Explorer(story)
+    mask = 0
+    for goal in goals:
+        mask |= story.flag_bit(goal)
+
+    def goals_of(flags):
+        return bin(flags & mask).count('1')
+
+    # The most goals reachable from every state, settled over the cycles
+    best = {state: goals_of(flags_of(state)) for state in explorer.transitions}
+    changed = True
+    while changed:
+        changed = False
+        for state, ways_out in explorer.transitions.items():
+            for _, next_state in ways_out:
+                if next_state is not None and best[next_state] > best[state]:
+                    best[state] = best[next_state]
+                    changed = True
+    # The worth of every answer, by node and the Player's flags at the prompt
+    scores = {}
+    for state, ways_out in explorer.transitions.items():
+        node = story.node(node_of(state))
+        flags = flags_of(state) | node.set_mask
+        scores[node_of(state), flags] = {
+            choice: goals_of(flags) if next_state is None
+            else best[next_state] for choice, next_state in ways_out}
+
+    def policy(player, prompt, rng):
+        worth = scores.get((player.position[0], player.flags), {})
+        top = max(worth.get(choice, 0) for choice in prompt.choices)
+        return rng.choice([choice for choice in prompt.choices
+                           if worth.get(choice, 0) == top])
+    return policy
+
+
+POLICIES = {
+    'uniform': lambda weights: uniform,
+    'weighted': weighted,
+    'greedy': lambda weights: greedy(),
+}
+
+
+def play(policy, rng, name='Player'):
+    """A function playing a game from the DarkRoom to its end, answering
+    every question with the policy. Returns the names of the rooms visited,
+    the number of answers given and the ending."""
+    player = Player(DarkRoom, name)
+    rooms = []
+    answers = 0
+
+    def answer(prompt):
+        nonlocal answers
+        answers += 1
+        return policy(player, prompt, rng)
+
+    drive(play_rooms(player, False,
+                     lambda room: rooms.append(room._room_name)),
+          None, answer)
+    return tuple(rooms), answers, player.ending or DEFAULT_ENDING
+
+
+def play_many(policy_name, weights, runs, seed):
+    """A function playing a number of games with one of the POLICIES.
+    Returns the endings, the ways through the rooms (Counters), the total
+    number of answers and the total number of rooms visited."""
+    policy = POLICIES[policy_name](weights)
+    rng = random.Random(seed)
+    endings = Counter()
+    paths = Counter()
+    answers = rooms = 0
+    for _ in range(runs):
+        path, path_answers, ending = play(policy, rng)
+        endings[ending] += 1
+        paths[path] += 1
+        answers += path_answers
+        rooms += len(path)
+    return endings, paths, answers, rooms
+
+
+def _play_chunk(arguments):
+    return play_many(*arguments)
+
+
+def playtest(policy_name='uniform', runs=100000, weights=None,
+             processes=None, seed=None, chunk_size=10000):
+    """A function spreading the games over a pool of processes and adding up
+    their results. Returns a dict with the runs, the endings and the paths
+    (Counters) and the average number of answers and rooms."""
+    weights = weights or {}
+    seed = random.randrange(1 << 32) if seed is None else seed
+    chunks = [(policy_name, weights, min(chunk_size, runs - start),
+               seed + number)
+              for number, start in enumerate(range(0, runs, chunk_size))]
+    endings, paths = Counter(), Counter()
+    answers = rooms = 0
+    with Pool(processes, adventure_game.use_story,
+              (adventure_game.story.path,)) as pool:
+        for result in pool.imap_unordered(_play_chunk, chunks):
+            endings.update(result[0])
+            paths.update(result[1])
+            answers += result[2]
+            rooms += result[3]
+    return {'runs': runs, 'endings': endings, 'paths': paths,
+            'answers': answers / runs if runs else 0.0,
+            'rooms': rooms / runs if runs else 0.0}
+
+
+def report(results, path_limit=10):
+    """A function returning the text report of a playtest."""
+    runs = results['runs']
+    lines = [f'{runs} games, {results["answers"]:.2f} answers and '
+             f'{results["rooms"]:.2f} rooms on average', '', 'Endings:']
+    for ending, count in results['endings'].most_common():
+        lines.append(f'  {ending}: {count} ({count / runs:.2%})')
+    lines += ['', 'Ways through the rooms:']
+    for path, count in results['paths'].most_common(path_limit):
+        lines.append(f'  {" > ".join(path)}: {count} ({count / runs:.2%})')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Parse the command line options, run the playtest and print the
+    report."""
+    parser = argparse.ArgumentParser(description='Play the game many times '
+                                                 'over with a choice policy.')
+    parser.add_argument('--policy', choices=sorted(POLICIES),
+                        default='uniform')
+    parser.add_argument('--runs', type=int, default=100000)
+    parser.add_argument('--weights', type=json.loads, default=None,
+                        help='relative chances of the answers for the '
+                             'weighted policy as JSON, e.g. \'{"yes": 2}\', '
+                             'the others have 1')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='the number of processes playing the games')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='make the games repeatable')
+    parser.add_argument('--story', default=adventure_game.STORY_PATH,
+                        help='the story to play, in the text or compiled '
+                             'form')
+    parser.add_argument('--paths', type=int, default=10, metavar='N',
+                        help='list the N most frequent ways through the '
+                             'rooms')
+    args = parser.parse_args(argv)
+    adventure_game.use_story(args.story)
+    results = playtest(args.policy, args.runs, args.weights, args.processes,
+                       args.seed)
+    print(report(results, args.paths))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""A profiler attributing the time and the memory taken by the game to the
+rooms and to the Player's moves between them.
+
+Every Python and built-in call is followed with sys.setprofile. The games
+are played twice: once timed, then once with tracemalloc following the
+memory allocated, as tracing the memory slows every allocation down and
+would throw the times off. The methods of the rooms are named after
+the room they run for (e.g. Prison.events), so the stacks tell the rooms
+apart even when they share a class. The results are written as collapsed
+stacks, one line per call path with its time in microseconds, the input of
+flamegraph.pl, speedscope and the like, and summed up in a table.
+"""
+
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+TRANSITIONS = ('Player.exit_current_room_to', 'Player.get_next_room',
+               'Player.enter_next_room', 'Player.enter_room', 'Player.move_to')
+MOVES = 'Player transitions'
+OTHER = 'other'
+
+
+def _traced():
+    return tracemalloc.get_traced_memory()[0]
+
+
+class Profiler:
+    """A class profiling the calls made while running a function.
+
+    Attributes:
+    -------------
+    room_class : type
+        The Room class of the game, whose methods are named after the room
+    self_times : Counter
+        The nanoseconds spent in every call path (collapsed stack), apart
+        from the calls it made
+    allocations : Counter
+        The bytes allocated and not freed in every call path, apart from the
+        calls it made
+    calls : Counter
+        The number of calls of every function
+    total_times : Counter
+        The nanoseconds spent in every function, with the calls it made
+
+    Methods:
+    -------------
+    run(function, *args)
+    write_collapsed(path)
+    by_room()
+    summary(limit)
+    """
+
+    def __init__(self, room_class):
+        self.room_class = room_class
+        self.self_times = Counter()
+        self.allocations = Counter()
+        self.calls = Counter()
+        self.total_times = Counter()
+        self._rooms = {}  # the room of every room method's name
+        self._stack = []
+
+    def _name(self, frame, event, arg):
+        if event == 'c_call':
+            return getattr(arg, '__qualname__', None) or repr(arg)
+        code = frame.f_code
+        if code.co_argcount and code.co_varnames[0] == 'self':
+            owner = frame.f_locals.get('self')
+            room = getattr(owner, '_room_name', None)  # None in __init__
+            if room is not None and isinstance(owner, self.room_class):
+                name = f'{room}.{code.co_name}'
+                self._rooms[name] = room
+                return name
+            return f'{type(owner).__name__}.{code.co_name}'
+        return code.co_name
+
+    def _enter(self, frame, event, arg, measure):
+        name = self._name(frame, event, arg)
+        path = f'{self._stack[-1][1]};{name}' if self._stack else name
+        self._stack.append([name, path, 0, measure()])
+        return name
+
+    def _leave(self, measure):
+        """A method popping the call returning off the stack. Returns its
+        call path, what it measured apart from its calls, and with them."""
+        name, path, children, start = self._stack.pop()
+        spent = measure() - start
+        if self._stack:
+            self._stack[-1][2] += spent
+        return name, path, spent - children, spent
+
+    def _time(self, frame, event, arg):
+        if event == 'call' or event == 'c_call':
+            self.calls[self._enter(frame, event, arg,
+                                   time.perf_counter_ns)] += 1
+        elif self._stack:  # a return, c_return or c_exception
+            name, path, spent, total = self._leave(time.perf_counter_ns)
+            self.self_times[path] += spent
+            self.total_times[name] += total
+
+    def _memory(self, frame, event, arg):
+        if event == 'call' or event == 'c_call':
+            self._enter(frame, event, arg, _traced)
+        elif self._stack:
+            _, path, allocated, _ = self._leave(_traced)
+            self.allocations[path] += allocated
+
+    def run(self, function, *args):
+        """A method running a function under the profiler, twice: timed,
+        then with its memory traced. Returns what the function returns the
+        second time."""
+        self._hook(self._time, function, *args)
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            return self._hook(self._memory, function, *args)
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+    def _hook(self, hook, function, *args):
+        sys.setprofile(hook)
+        try:
+            return function(*args)
+        finally:
+            sys.setprofile(None)
+            self._stack = []
+
+    def write_collapsed(self, path):
+        """A method writing the time of every call path as collapsed stacks,
+        in microseconds."""
+        with open(path, 'w') as file:
+            for stack, nanoseconds in sorted(self.self_times.items()):
+                if nanoseconds >= 1000:
+                    file.write(f'{stack} {nanoseconds // 1000}\n')
+
+    def _part(self, stack):
+        """A method returning what a call path is attributed to: the room of
+        the innermost room method in it, the Player's moves between the
+        rooms or nothing in particular."""
+        for name in reversed(stack.split(';')):
+            if name in self._rooms:
+                return self._rooms[name]
+            if name in TRANSITIONS:
+                return MOVES
+        return OTHER
+
+    def by_room(self):
+        """A method returning the nanoseconds and the bytes allocated by
+        every room, the Player's moves between the rooms and the rest."""
+        times, allocations = Counter(), Counter()
+        for stack, nanoseconds in self.self_times.items():
+            part = self._part(stack)
+            times[part] += nanoseconds
+            allocations[part] += self.allocations[stack]
+        return times, allocations
+
+    def summary(self, limit=15):
+        """A method returning the summary table: the time and memory of every
+        room and of the Player's moves, and the functions taking the most
+        time."""
+        times, allocations = self.by_room()
+        total = sum(times.values()) or 1
+        lines = [f'{"part":28} {"ms":>10} {"share":>7} {"net memory":>12}']
+        for part, nanoseconds in times.most_common():
+            lines.append(f'{part:28} {nanoseconds / 1e6:10.2f} '
+                         f'{nanoseconds / total:7.1%} '
+                         f'{allocations[part]:10} B')
+        self_by_name = Counter()
+        for stack, nanoseconds in self.self_times.items():
+            self_by_name[stack.rsplit(';', 1)[-1]] += nanoseconds
+        lines += ['', f'{"function":40} {"calls":>9} {"self ms":>10} '
+                      f'{"total ms":>10}']
+        for name, nanoseconds in self_by_name.most_common(limit):
+            lines.append(f'{name[:40]:40} {self.calls[name]:9} '
+                         f'{nanoseconds / 1e6:10.2f} '
+                         f'{self.total_times[name] / 1e6:10.2f}')
+        return '\n'.join(lines)
@@ -0,0 +1,184 @@
+"""Saving the Players' progress, so that an interrupted game can be resumed.
+
+Snapshots are appended to a log file, one small binary record per snapshot:
+
+    key length (u8), name length (u8), cursor (u16), node (u32), flags (u32),
+    story checksum (u32), key, name
+
+The key identifies the saved game, the name is the Player's name and node and
+cursor are the Player's position in the story (see Player.position). The last
+record of a key wins. A game that is over is recorded with node FINISHED.
+
+Records are written with a single write each and never rewritten, so many
+games can be saved at the same time without rewriting or syncing the file
+after every change. The last snapshot of every game is kept in memory, so
+a lookup only reads the records appended since the previous one.
+"""
+
+import os
+import struct
+import time
+from collections import namedtuple
+
+FINISHED = 0xFFFFFFFF
+
+_RECORD = struct.Struct('<BBHIII')
+MAX_LENGTH = 255  # bytes of a key or a name, longer ones are cut
+
+Snapshot = namedtuple('Snapshot', ['key', 'name', 'node', 'cursor', 'flags',
+                                   'story'])
+Snapshot.__doc__ = """A saved state of a game.
+
+Attributes:
+-------------
+key : str
+    The key of the saved game
+name : str
+    The name of the Player
+node : int
+    The index of the node the Player is in, FINISHED if the game is over
+cursor : int
+    The number of the node's messages already shown
+flags : int
+    The Player's flags, as a bitfield
+story : int
+    The checksum of the story the game was played with
+"""
+
+
+def _cut(text, length=MAX_LENGTH):
+    """A function returning text encoded in UTF-8 and cut to length bytes,
+    on a character boundary."""
+    data = text.encode('utf-8')
+    if len(data) <= length:
+        return data
+    return data[:length].decode('utf-8', 'ignore').encode('utf-8')
+
+
+class SaveLog:
+    """A class saving snapshots to an append-only log file.
+
+    Attributes:
+    -------------
+    path : str
+        The path of the log
+    story : Story
+        The story the games are played with
+    sync_interval : float
+        The number of seconds between syncs of the log to the disk, None to
+        leave it to the operating system
+
+    Methods:
+    -------------
+    save(player, key)
+    load()
+    get(key)
+    compact()
+    close()
+    """
+
+    def __init__(self, path, story, sync_interval=None):
+        self.path = path
+        self.story = story
+        self.sync_interval = sync_interval
+        self._file = open(path, 'ab', buffering=0)
+        self._last_sync = time.monotonic()
+        self._index = {}  # the last snapshot of every game read so far
+        self._indexed = 0  # the size of the log read so far
+        self._inode = None
+        self._catch_up()
+
+    def save(self, player, key=None):
+        """A method appending the Player's snapshot to the log. The key is the
+        Player's name by default. Keys and names are cut to MAX_LENGTH
+        bytes."""
+        if player.position is None:
+            node, cursor = FINISHED, 0
+        else:
+            node, cursor = player.position
+        key = _cut(player.name if key is None else key)
+        name = _cut(player.name)
+        record = (_RECORD.pack(len(key), len(name), cursor, node,
+                               player.flags, self.story.checksum)
+                  + key + name)
+        self._file.write(record)
+        end = self._file.tell()
+        if end - len(record) == self._indexed:
+            # Nothing else has been appended since the log was last read
+            self._read(record, 0, self._index)
+            self._indexed = end
+        if (self.sync_interval is not None
+                and time.monotonic() - self._last_sync > self.sync_interval):
+            os.fsync(self._file.fileno())
+            self._last_sync = time.monotonic()
+
+    def _read(self, data, offset, snapshots):
+        """A method reading the records of the log in data from offset on
+        into snapshots, the last snapshot of every game by key. Returns the
+        offset past the last whole record."""
+        while offset + _RECORD.size <= len(data):
+            (key_length, name_length, cursor, node, flags,
+             story) = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + key_length + name_length
+            if end > len(data):
+                break  # a record cut short by a crash, or still being written
+            key = data[offset + _RECORD.size:end - name_length].decode(
+                'utf-8', 'replace')
+            name = data[end - name_length:end].decode('utf-8', 'replace')
+            offset = end
+            if node == FINISHED or story != self.story.checksum:
+                snapshots.pop(key, None)
+            else:
+                snapshots[key] = Snapshot(key, name, node, cursor, flags,
+                                          story)
+        return offset
+
+    def load(self):
+        """A method reading the log. Returns the last snapshot of every game
+        that is not over and was played with the same story, by key."""
+        snapshots = {}
+        with open(self.path, 'rb') as file:
+            self._read(file.read(), 0, snapshots)
+        return snapshots
+
+    def _catch_up(self):
+        """A method reading the records appended to the log since it was last
+        read, by this process or any other, into the index of the last
+        snapshots. The whole log is read again if it has been compacted."""
+        with open(self.path, 'rb') as file:
+            status = os.fstat(file.fileno())
+            if status.st_ino != self._inode or status.st_size < self._indexed:
+                self._index = {}
+                self._indexed = 0
+                self._inode = status.st_ino
+            file.seek(self._indexed)
+            self._indexed += self._read(file.read(), 0, self._index)
+
+    def get(self, key):
+        """A method returning the last snapshot of the game with the given
+        key, None if there is no game to resume. The key is cut the same way
+        as when the game was saved. Only the records appended since the last
+        lookup are read."""
+        self._catch_up()
+        return self._index.get(_cut(key).decode('utf-8'))
+
+    def compact(self):
+        """A method rewriting the log so that it only holds the last snapshot
+        of every game that is not over."""
+        snapshots = self.load()
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            for snapshot in snapshots.values():
+                key = snapshot.key.encode('utf-8')
+                name = snapshot.name.encode('utf-8')
+                file.write(_RECORD.pack(len(key), len(name), snapshot.cursor,
+                                        snapshot.node, snapshot.flags,
+                                        snapshot.story) + key + name)
+        self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, 'ab', buffering=0)
+        self._catch_up()
+
+    def close(self):
+        """A method closing the log."""
+        self._file.close()
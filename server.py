@@ -0,0 +1,307 @@
+#!/usr/bin/python3
+"""A server hosting many players at once, each connected over a socket, e.g.
+
+    python server.py --port 8023
+    telnet localhost 8023
+
+All sessions run on a single asyncio event loop. The rooms' stories are
+driven through Room.events, so the typewriter effect and waiting for the
+Player's answers never block the other sessions. The typewriter effect of all
+the sessions is driven by a single RenderScheduler timer.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+
+import adventure_game
+from adventure_game import (SINKS, DarkRoom, Player, Prompt, TextCache,
+                            TypewriterSink, play_rooms)
+from journal import Journal
+from saves import SaveLog
+from sessions import SessionTable, TableFull
+
+
+class SessionClosed(Exception):
+    """The Player has disconnected."""
+
+
+class RenderScheduler:
+    """A class typing out the messages of all the sessions on a single timer.
+    Every message is a render job, the frames of a TypewriterSink and the
+    stream they go to; on every tick the next frame of every job is written
+    in one pass. The timer only runs while there are jobs.
+
+    Attributes:
+    -------------
+    frame_rate : float
+        How many times per second the jobs are advanced
+    max_buffer : int
+        The number of bytes waiting to be sent to a Player above which the
+        Player's job is not advanced until they are sent
+
+    Methods:
+    -------------
+    render(writer, frames)
+    """
+
+    def __init__(self, frame_rate=10, max_buffer=1 << 16):
+        self.frame_rate = frame_rate
+        self.max_buffer = max_buffer
+        self._jobs = []
+        self._timer = None
+
+    def render(self, writer, frames):
+        """A method writing the first frame at once and scheduling the others.
+        Returns a future done when the last frame is written."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self._jobs.append((writer, frames, done))
+        self._advance(self._jobs[-1])
+        if self._timer is None:
+            self._timer = loop.call_later(1 / self.frame_rate, self._tick)
+        return done
+
+    def _advance(self, job):
+        """A method writing the next frame of a job. Returns False when the
+        job is over."""
+        writer, frames, done = job
+        if done.done() or writer.is_closing():
+            if not done.done():
+                done.set_result(None)
+            return False
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            return True  # the Player cannot keep up, skip a frame
+        for chunk in frames:
+            writer.write(chunk)
+            return True
+        done.set_result(None)
+        return False
+
+    def _tick(self):
+        self._jobs = [job for job in self._jobs if self._advance(job)]
+        if self._jobs:
+            self._timer = asyncio.get_running_loop().call_later(
+                1 / self.frame_rate, self._tick)
+        else:
+            self._timer = None
+
+
+class Session:
+    """A class handling the game of a single connected Player.
+
+    Attributes:
+    -------------
+    _reader : asyncio.StreamReader
+        The stream of the Player's input
+    _writer : asyncio.StreamWriter
+        The stream of the game's output
+    _sink : OutputSink
+        The sink deciding how the narrative text is typed out
+    _saves : SaveLog
+        The log (or SessionTable) the progress is saved to, None if it is not
+        saved
+    _journal : Journal
+        The journal the games are recorded to, None if they are not recorded
+    _scheduler : RenderScheduler
+        The scheduler typing out the messages
+
+    Methods:
+    -------------
+    run()
+    play(player)
+    save(player)
+    say(text, end)
+    pause()
+    ask(prompt, choices)
+    read_line()
+    """
+
+    def __init__(self, reader, writer, sink, saves=None, journal=None,
+                 scheduler=None):
+        self._reader = reader
+        self._writer = writer
+        self._sink = sink
+        self._saves = saves
+        self._journal = journal
+        self._scheduler = scheduler or RenderScheduler(
+            getattr(sink, 'frame_rate', 10))
+
+    async def run(self):
+        """A method running the whole game, from asking for the name to the
+        end of the game, and closing the connection afterwards."""
+        try:
+            name = await self.ask('Name yor character: ')
+            await self.say('---Press ENTER to continue when you see "..."---')
+            snapshot = self._saves.get(name) if self._saves else None
+            if snapshot and await self.ask(
+                    'Continue the saved game (yes/no)?',
+                    ('yes', 'no')) == 'yes':
+                player = Player.resume(snapshot)
+            else:
+                player = Player(DarkRoom, name)
+            player.saves = self if self._saves else None
+            if self._journal:
+                self._journal.start(player)
+            await self.play(player)
+            await self.say('Game over')
+        except (SessionClosed, ConnectionError):
+            pass
+        finally:
+            self._writer.close()
+
+    async def play(self, player):
+        """A method playing the rooms one after another, the same way the
+        game engine does in the terminal (see play_rooms)."""
+        events = play_rooms(player)
+        try:
+            event = next(events)
+            while True:
+                if isinstance(event, Prompt):
+                    event = events.send(await self.ask(event.text,
+                                                       event.choices))
+                else:
+                    await self.say(event)
+                    event = next(events)
+        except StopIteration:
+            pass
+
+    def save(self, player):
+        """A method saving the Player's progress (the session is the Player's
+        saves), going on without saving if the session table is full."""
+        try:
+            self._saves.save(player)
+        except TableFull:
+            player.saves = None
+
+    async def say(self, text, end='\n ...'):
+        """A method typing out a message and waiting for the Player to press
+        ENTER."""
+        if isinstance(self._sink, TypewriterSink):
+            await self._scheduler.render(self._writer,
+                                         self._sink.frames(text, end))
+        else:
+            self._writer.write(self._sink.cache.render(text, end))
+        await self._writer.drain()
+        await self.pause()
+
+    async def pause(self):
+        """A method waiting for the Player to press ENTER."""
+        await self.read_line()
+
+    async def ask(self, prompt, choices=None):
+        """A method asking the Player until the answer is one of the choices
+        (any answer if choices is None)."""
+        while True:
+            self._writer.write(prompt.encode())
+            await self._writer.drain()
+            answer = await self.read_line()
+            if answer is None:
+                continue  # too long, ask again
+            if choices is None:
+                return answer
+            if answer.strip() in choices:
+                return answer.strip()
+
+    async def read_line(self):
+        """A method reading a line of the Player's input. Returns None if the
+        line is longer than the reader's limit, the line being dropped.
+        Raises SessionClosed if the Player has disconnected."""
+        too_long = False
+        while True:
+            try:
+                line = await self._reader.readuntil(b'\n')
+            except asyncio.IncompleteReadError as error:
+                line = error.partial  # the input ends without a newline
+            except asyncio.LimitOverrunError as error:
+                # Drop what has come of the line, and the rest of it later
+                await self._reader.readexactly(error.consumed)
+                too_long = True
+                continue
+            if not line:
+                raise SessionClosed()
+            if too_long:
+                return None
+            return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+
+def main(argv=None):
+    """Parse the command line options and serve the game until
+    interrupted."""
+    parser = argparse.ArgumentParser(description='Host the adventure game '
+                                                 'for many players.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8023)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--text', choices=sorted(SINKS), default='typewriter',
+                        help='the way the narrative text is printed')
+    storage = parser.add_mutually_exclusive_group()
+    storage.add_argument('--save', metavar='PATH',
+                         help='save the progress to the given file, and offer '
+                              'to resume the games saved there')
+    storage.add_argument('--sessions', metavar='PATH',
+                         help='keep the games in progress in a table shared '
+                              'by the workers, in the given file (e.g. in '
+                              '/dev/shm), and offer to resume them')
+    parser.add_argument('--rows', type=int, default=4096,
+                        help='the number of games the session table holds')
+    parser.add_argument('--journal', metavar='PATH',
+                        help='record every room, answer and flag of the games '
+                             'to the given file')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='the number of processes serving the Players, '
+                             'sharing the listening socket')
+    args = parser.parse_args(argv)
+    if args.workers > 1 and not hasattr(os, 'fork'):
+        parser.error('--workers needs a system with fork')
+    if args.sessions:
+        saves = SessionTable(args.sessions, adventure_game.story, args.rows)
+    else:
+        saves = SaveLog(args.save, adventure_game.story) if args.save else None
+    journal = (Journal(args.journal, adventure_game.story) if args.journal
+               else None)
+    cache = TextCache(width=0)  # the Players' terminal widths are unknown
+    scheduler = RenderScheduler(
+        getattr(SINKS[args.text](cache=cache), 'frame_rate', 10))
+
+    async def handle(reader, writer):
+        await Session(reader, writer, SINKS[args.text](cache=cache), saves,
+                      journal, scheduler).run()
+
+    async def serve(listener):
+        if args.unix:
+            server = await asyncio.start_unix_server(handle, sock=listener)
+        else:
+            server = await asyncio.start_server(handle, sock=listener)
+        async with server:
+            await server.serve_forever()
+
+    if args.unix:
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(args.unix)
+        listener.listen(socket.SOMAXCONN)
+    else:
+        listener = socket.create_server((args.host, args.port),
+                                        backlog=socket.SOMAXCONN)
+    workers = []
+    try:
+        # The workers are forked after the socket, the story and the session
+        # table are set up, and all accept the Players from the same socket
+        for _ in range(args.workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                workers = []
+                break
+            workers.append(pid)
+        asyncio.run(serve(listener))
+    except KeyboardInterrupt:
+        for pid in workers:
+            os.waitpid(pid, 0)
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
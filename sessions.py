@@ -0,0 +1,240 @@
+"""A table of the games in progress, shared by all the processes of a server
+through a memory-mapped file, so that a game can be resumed by whichever
+process the Player reconnects to.
+
+The table is a file of fixed-size rows after a small header. A game is kept
+in the row its key hashes to, or in the first free row after it:
+
+    sequence (u32), state (u8), name length (u8), cursor (u16), node (u32),
+    flags (u32), story checksum (u32), saved (u32), key digest, name
+
+The key is kept as a digest of the whole key and the name is cut on
+a character boundary. node and cursor are the Player's position in the
+story (see Player.position), flags the Player's flags, has_bottle and
+has_key among them, and saved the time the row was last written at. When
+every row is taken, the game saved the longest ago gives its row up.
+
+The writers of a row lock it with fcntl.lockf, while the readers do not
+lock at all: a writer makes the sequence odd before changing a row and even
+again afterwards, and a reader copies the row until it reads the same even
+sequence before and after. The table offers the same save and get as
+a SaveLog, so it can be used as the Players' saves.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+from saves import Snapshot, _cut
+
+MAGIC = b'ADVT'
+VERSION = 2
+DIGEST_SIZE = 16
+NAME_SIZE = 52
+
+EMPTY, USED, DELETED = 0, 1, 2
+
+_HEADER = struct.Struct('<4sHxxI')  # magic, version, number of rows
+_ROW = struct.Struct(f'<IBBHIIII{DIGEST_SIZE}s{NAME_SIZE}s')
+_SEQUENCE = struct.Struct('<I')
+
+
+def _digest(key):
+    """A function returning the digest a key is kept under."""
+    return hashlib.blake2b(key.encode('utf-8'),
+                           digest_size=DIGEST_SIZE).digest()
+
+
+class TableFull(Exception):
+    """There is no free row left in the session table."""
+
+
+class SessionTable:
+    """A class keeping the games in progress in a table shared by the
+    processes through a memory-mapped file.
+
+    Attributes:
+    -------------
+    path : str
+        The path of the table's file, e.g. in /dev/shm
+    story : Story
+        The story the games are played with
+    rows : int
+        The number of rows, i.e. of games the table can hold
+
+    Methods:
+    -------------
+    save(player, key)
+    get(key)
+    delete(key)
+    close()
+    """
+
+    def __init__(self, path, story, rows=4096):
+        self.path = path
+        self.story = story
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, _HEADER.size)
+            if os.fstat(fd).st_size < _HEADER.size:  # a new table
+                os.ftruncate(fd, _HEADER.size + rows * _ROW.size)
+                os.pwrite(fd, _HEADER.pack(MAGIC, VERSION, rows), 0)
+            magic, version, self.rows = _HEADER.unpack(
+                os.pread(fd, _HEADER.size, 0))
+            fcntl.lockf(fd, fcntl.LOCK_UN, _HEADER.size)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{path} is not a session table')
+            self._map = mmap.mmap(fd, _HEADER.size + self.rows * _ROW.size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def _offset(self, row):
+        return _HEADER.size + row * _ROW.size
+
+    def _probe(self, digest):
+        """A generator yielding the rows a key may be in, in order."""
+        home = int.from_bytes(digest[:4], 'little') % self.rows
+        for step in range(self.rows):
+            yield (home + step) % self.rows
+
+    def _read(self, row):
+        """A method copying a row without locking it. Returns the fields of
+        the row."""
+        offset = self._offset(row)
+        for _ in range(1000):
+            sequence = _SEQUENCE.unpack_from(self._map, offset)[0]
+            if sequence & 1:
+                continue  # being written
+            fields = _ROW.unpack_from(self._map, offset)
+            # The copy holds if no writer has started since it began
+            if _SEQUENCE.unpack_from(self._map, offset)[0] == sequence:
+                return fields
+        # A writer is slow or has died while writing, wait for its lock
+        self._lock(offset, _ROW.size, fcntl.LOCK_SH)
+        try:
+            return _ROW.unpack_from(self._map, offset)
+        finally:
+            self._lock(offset, _ROW.size, fcntl.LOCK_UN)
+
+    def _write(self, row, *fields):
+        """A method changing a row the caller holds the lock of."""
+        offset = self._offset(row)
+        sequence = _SEQUENCE.unpack_from(self._map, offset)[0]
+        # Odd even if a writer has died and left the sequence odd
+        writing = sequence | 1
+        _SEQUENCE.pack_into(self._map, offset, writing)
+        _ROW.pack_into(self._map, offset, writing, *fields)
+        _SEQUENCE.pack_into(self._map, offset, (writing + 1) & 0xFFFFFFFF)
+
+    def _lock(self, start, length, operation=fcntl.LOCK_EX):
+        fcntl.lockf(self._fd, operation, length, start)
+
+    def _bucket(self, digest):
+        """A method returning the offset of the byte past the rows whose lock
+        serializes the changes of a key, so that a key is never put in two
+        rows at once."""
+        return (self._offset(self.rows)
+                + int.from_bytes(digest[:4], 'little') % self.rows)
+
+    def _find(self, digest):
+        """A method returning the row holding the key, the row the key could
+        be put in and the sequence the latter had when it was read, the rows
+        None if there is none. The row for the key is the first free one, or
+        if every row is taken, the one saved the longest ago."""
+        free = seen = oldest = None
+        for row in self._probe(digest):
+            (sequence, state, _, _, _, _, _, saved, row_digest,
+             _) = self._read(row)
+            if state == USED:
+                if row_digest == digest:
+                    return row, free, seen
+                if oldest is None or saved < oldest[2]:
+                    oldest = row, sequence, saved
+            elif free is None:
+                free, seen = row, sequence
+            if state == EMPTY:
+                break
+        if free is None and oldest is not None:
+            free, seen, _ = oldest
+        return None, free, seen
+
+    def save(self, player, key=None):
+        """A method keeping the Player's state under the key (the Player's
+        name by default). A game that is over is removed from the table.
+        Raises TableFull if there is no row left for a new game."""
+        digest = _digest(player.name if key is None else key)
+        if player.position is None:
+            self._remove(digest)
+            return
+        node, cursor = player.position
+        name = _cut(player.name, NAME_SIZE)
+        fields = (USED, len(name), cursor, node, player.flags,
+                  self.story.checksum, int(time.time()) & 0xFFFFFFFF,
+                  digest, name)
+        bucket = self._bucket(digest)
+        self._lock(bucket, 1)
+        try:
+            while True:
+                row, free, seen = self._find(digest)
+                if row is None:
+                    if free is None:
+                        raise TableFull(f'all the {self.rows} rows are used')
+                    row = free
+                self._lock(self._offset(row), _ROW.size)
+                current = _ROW.unpack_from(self._map, self._offset(row))
+                # The row may have been given to another key in the meantime
+                if (row == free and current[0] == seen
+                        or current[1] == USED and current[8] == digest):
+                    break
+                self._lock(self._offset(row), _ROW.size, fcntl.LOCK_UN)
+            try:
+                self._write(row, *fields)
+            finally:
+                self._lock(self._offset(row), _ROW.size, fcntl.LOCK_UN)
+        finally:
+            self._lock(bucket, 1, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """A method returning the state of the game with the given key, as
+        a Snapshot, None if there is no game to resume."""
+        digest = _digest(key)
+        row, _, _ = self._find(digest)
+        if row is None:
+            return None
+        (_, state, name_length, cursor, node, flags, story, _, row_digest,
+         name) = self._read(row)
+        if (state != USED or row_digest != digest
+                or story != self.story.checksum):
+            return None  # removed in the meantime, or another story
+        return Snapshot(key, name[:name_length].decode('utf-8', 'replace'),
+                        node, cursor, flags, story)
+
+    def delete(self, key):
+        """A method removing the game with the given key from the table."""
+        self._remove(_digest(key))
+
+    def _remove(self, digest):
+        bucket = self._bucket(digest)
+        self._lock(bucket, 1)
+        try:
+            row, _, _ = self._find(digest)
+            if row is not None:
+                self._lock(self._offset(row), _ROW.size)
+                try:
+                    current = _ROW.unpack_from(self._map, self._offset(row))
+                    if current[1] == USED and current[8] == digest:
+                        self._write(row, DELETED, 0, 0, 0, 0, 0, 0, b'', b'')
+                finally:
+                    self._lock(self._offset(row), _ROW.size, fcntl.LOCK_UN)
+        finally:
+            self._lock(bucket, 1, fcntl.LOCK_UN)
+
+    def close(self):
+        """A method closing the table."""
+        self._map.close()
+        os.close(self._fd)
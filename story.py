@@ -0,0 +1,602 @@
+#!/usr/bin/python3
+"""Reading, compiling and loading of the game's story.
+
+The story is written as a plain text file made of nodes. Every node starts
+with a header line holding its name. The part of the name before the first
+dot is the room the node belongs to and the node named exactly like the room
+is the place where the Player enters that room:
+
+    == Prison.guard
+    You continue your journey through the prison.
+    "Who are you?! Surrender!" he shouts.
+    @prompt Should you fight (1) or try to escape (2)?
+    @choice 1 -> Prison.fight
+    @choice 2 -> Prison.escape
+
+Lines of a node:
+
+    text line                   a message shown to the Player, "{name}" is
+                                replaced with the Player's name
+    @set <flag>                 sets a Player flag (e.g. has_key) once the
+                                messages have been shown
+    @ending <text>              the game ends with the given ending
+    @prompt <text>              asks the Player a question...
+    @choice <answer> -> <node>  ...and leads to <node> for the given answer
+    @goto <node>                the node the story moves on to without asking
+
+@choice and @goto lines may end with a guard, e.g. "if has_bottle and not
+has_key", and are only available when the guard holds. The first available
+@goto is taken. A node without any available way out ends the game, with
+DEFAULT_ENDING if no @ending has been reached. Lines starting with "#" are
+comments.
+
+The text form is compiled into a compact binary file, which is memory-mapped
+when the story is loaded. Nodes are decoded only when the game reaches them,
+so loading even a large story takes next to no time. The nodes are decoded
+a room at a time, when the game first reaches the room, and only the most
+recently entered rooms are kept decoded; the names, questions and answers
+decoded along the way are kept up to a fixed number. The memory taken by
+the story thus depends on the rooms being played rather than on the size of
+the story. The rooms the current room leads to can be decoded ahead of time
+in the background. Every distinct message is stored once in the compiled
+story, however many nodes show it, and passages shared by several nodes can
+be written once as a node of their own that the others @goto. The messages
+are read from the memory map whenever they are shown instead of being kept
+as Python strings, so processes forked from one another share the text of
+the story in the page cache and never copy it.
+
+Usage:
+
+    python story.py story.txt [-o story.bin]
+"""
+
+import argparse
+import mmap
+import os
+import queue
+import struct
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from collections.abc import Sequence
+
+MAGIC = b'ADVS'
+VERSION = 2
+END = -1  # the target of a way out that ends the game
+DEFAULT_ENDING = 'BAD END'
+
+_HEADER = struct.Struct('<4sHHIIIIII')
+_NODE = struct.Struct('<IIIIiIIIi')
+_EDGE = struct.Struct('<iiII')
+_U32 = struct.Struct('<I')
+_SPAN = struct.Struct('<II')
+
+Node = namedtuple('Node', ['name', 'room', 'texts', 'prompt', 'edges',
+                           'set_mask', 'ending'])
+Node.__doc__ = """A node of the story.
+
+Attributes:
+-------------
+name : str
+    The name of the node
+room : str
+    The name of the room the node belongs to
+texts : Texts
+    The messages shown to the Player
+prompt : str
+    The question asked to the Player, None if the story moves on by itself
+edges : tuple
+    The ways out of the node (Edge)
+set_mask : int
+    The flags set when the node is reached, as a bitfield
+ending : str
+    The ending of the game reached in the node, None if there is none
+"""
+
+Edge = namedtuple('Edge', ['choice', 'target', 'require', 'forbid'])
+Edge.__doc__ = """A way out of a node.
+
+Attributes:
+-------------
+choice : str
+    The answer leading this way, None for a @goto
+target : int
+    The index of the node it leads to, END if it ends the game
+require : int
+    The flags that have to be set to go this way, as a bitfield
+forbid : int
+    The flags that must not be set to go this way, as a bitfield
+"""
+
+
+class StoryError(ValueError):
+    """An error in the text form of a story."""
+
+    def __init__(self, message, line_number=None):
+        if line_number is not None:
+            message = f'line {line_number}: {message}'
+        super().__init__(message)
+
+
+class Texts(Sequence):
+    """A class giving access to the messages of a node, a sequence of str
+    decoded from the memory map of the story every time they are read.
+
+    Attributes:
+    -------------
+    _story : Story
+        The story the messages belong to
+    _start : int
+        The index of the first message in the story's list of messages
+    _count : int
+        The number of messages
+    """
+
+    __slots__ = ('_story', '_start', '_count')
+
+    def __init__(self, story, start, count):
+        self._story = story
+        self._start = start
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            text, start = self._story.text, self._start
+            return [text(start + i)
+                    for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('message index out of range')
+        return self._story.text(self._start + index)
+
+    def __repr__(self):
+        return f'Texts({list(self)!r})'
+
+
+def room_of(node_name):
+    """A function returning the name of the room a node belongs to."""
+    return node_name.split('.', 1)[0]
+
+
+def _parse_guard(guard, line_number):
+    """A function turning a guard such as "has_bottle and not has_key" into
+    the lists of required and forbidden flags."""
+    required, forbidden = [], []
+    for term in guard.split(' and '):
+        words = term.split()
+        if len(words) == 1:
+            required.append(words[0])
+        elif len(words) == 2 and words[0] == 'not':
+            forbidden.append(words[1])
+        else:
+            raise StoryError(f'invalid guard: {guard}', line_number)
+    return required, forbidden
+
+
+def _parse_edge(rest, line_number):
+    """A function parsing "<node> [if <guard>]" into the target node name and
+    the guard's flags."""
+    target, _, guard = rest.partition(' if ')
+    required, forbidden = (_parse_guard(guard.strip(), line_number) if guard
+                           else ([], []))
+    return target.strip(), required, forbidden, line_number
+
+
+def parse_story(text):
+    """A function parsing the text form of a story. Returns the list of nodes
+    as dictionaries, in the order they were written."""
+    nodes = []
+    node = None
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('=='):
+            node = {'name': line[2:].strip(), 'texts': [], 'prompt': None,
+                    'edges': [], 'flags': [], 'ending': None,
+                    'line': line_number}
+            nodes.append(node)
+            continue
+        if node is None:
+            raise StoryError('text outside of a node', line_number)
+        if not line.startswith('@'):
+            node['texts'].append(line)
+            continue
+        keyword, _, rest = line[1:].partition(' ')
+        rest = rest.strip()
+        if keyword == 'set':
+            node['flags'].append(rest)
+        elif keyword == 'ending':
+            node['ending'] = rest
+        elif keyword == 'prompt':
+            node['prompt'] = rest
+        elif keyword == 'choice':
+            choice, arrow, target = rest.partition('->')
+            if not arrow:
+                raise StoryError('@choice needs "->"', line_number)
+            node['edges'].append((choice.strip(),)
+                                 + _parse_edge(target, line_number))
+        elif keyword == 'goto':
+            node['edges'].append((None,) + _parse_edge(rest, line_number))
+        else:
+            raise StoryError(f'unknown keyword: @{keyword}', line_number)
+    return nodes
+
+
+def _check_story(nodes):
+    """A function checking if the parsed nodes form a valid story."""
+    names = {}
+    for node in nodes:
+        if node['name'] in names:
+            raise StoryError(f'duplicate node {node["name"]}', node['line'])
+        names[node['name']] = node
+    for node in nodes:
+        choices = [edge for edge in node['edges'] if edge[0] is not None]
+        if node['prompt'] is not None and not choices:
+            raise StoryError('@prompt without any @choice', node['line'])
+        if choices and node['prompt'] is None:
+            raise StoryError('@choice without a @prompt', node['line'])
+        if choices and len(choices) != len(node['edges']):
+            raise StoryError('@choice and @goto in the same node',
+                             node['line'])
+        for _, target, _, _, line_number in node['edges']:
+            if target == 'end':
+                continue
+            if target not in names:
+                raise StoryError(f'unknown node {target}', line_number)
+            if (room_of(target) != room_of(node['name'])
+                    and target != room_of(target)):
+                raise StoryError(f'{target} is not the entrance of room '
+                                 f'{room_of(target)}', line_number)
+
+
+def compile_story(text):
+    """A function compiling the text form of a story into its binary form.
+    Returns the bytes of the compiled story."""
+    nodes = parse_story(text)
+    _check_story(nodes)
+    strings, string_ids = [], {}
+    flags, flag_bits = [], {}
+
+    def string_id(string):
+        if string not in string_ids:
+            string_ids[string] = len(strings)
+            strings.append(string)
+        return string_ids[string]
+
+    def mask(flag_names):
+        bits = 0
+        for flag in flag_names:
+            if flag not in flag_bits:
+                if len(flags) == 32:
+                    raise StoryError('a story may use at most 32 flags')
+                flag_bits[flag] = 1 << len(flags)
+                flags.append(flag)
+            bits |= flag_bits[flag]
+        return bits
+
+    node_ids = {node['name']: index for index, node in enumerate(nodes)}
+    node_records, edge_records, text_refs = [], [], []
+    for node in nodes:
+        set_mask = mask(node['flags'])
+        prompt = -1 if node['prompt'] is None else string_id(node['prompt'])
+        ending = -1 if node['ending'] is None else string_id(node['ending'])
+        node_records.append(_NODE.pack(
+            string_id(node['name']), string_id(room_of(node['name'])),
+            len(text_refs), len(node['texts']), prompt, len(edge_records),
+            len(node['edges']), set_mask, ending))
+        text_refs.extend(string_id(text) for text in node['texts'])
+        for choice, target, required, forbidden, _ in node['edges']:
+            edge_records.append(_EDGE.pack(
+                -1 if choice is None else string_id(choice),
+                END if target == 'end' else node_ids[target],
+                mask(required), mask(forbidden)))
+    flag_refs = [string_id(flag) for flag in flags]
+    name_index = sorted(range(len(nodes)), key=lambda i: nodes[i]['name'])
+
+    blob = bytearray()
+    offsets = []
+    for string in strings:
+        offsets.append(len(blob))
+        blob += string.encode('utf-8')
+    offsets.append(len(blob))
+
+    parts = []
+    parts.extend(_U32.pack(ref) for ref in flag_refs)
+    parts.extend(node_records)
+    parts.extend(edge_records)
+    parts.extend(_U32.pack(ref) for ref in text_refs)
+    parts.extend(_U32.pack(index) for index in name_index)
+    parts.extend(_U32.pack(offset) for offset in offsets)
+    parts.append(bytes(blob))
+    body = b''.join(parts)
+    return _HEADER.pack(MAGIC, VERSION, len(flags), len(nodes),
+                        len(edge_records), len(text_refs), len(strings),
+                        len(blob), zlib.crc32(body)) + body
+
+
+class Story:
+    """A class giving access to a compiled story through a memory map.
+
+    Attributes:
+    -------------
+    path : str
+        The path of the compiled story
+    flags : tuple
+        The names of the flags used by the story, the n-th flag is the n-th
+        bit of the bitfields
+    checksum : int
+        The CRC-32 of the compiled story, telling different stories (or
+        versions of a story) apart
+    room_limit : int
+        The number of rooms whose nodes are kept decoded
+    cache_limit : int
+        The number of decoded strings and of found node names kept, each
+        cache is emptied when it is full
+
+    Methods:
+    -------------
+    string(index)
+    text(index)
+    node(index)
+    load_room(room, prefetch)
+    prefetch(rooms)
+    find(name)
+    flag_bit(flag)
+    """
+
+    def __init__(self, path, room_limit=64, cache_limit=4096):
+        self.path = path
+        self.room_limit = room_limit
+        self.cache_limit = cache_limit
+        with open(path, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, flag_count, self.node_count, edge_count,
+         text_count, string_count, _,
+         self.checksum) = _HEADER.unpack_from(self._data)
+        if magic != MAGIC or version != VERSION:
+            raise StoryError(f'{path} is not a compiled story')
+        self._flags_at = _HEADER.size
+        self._nodes_at = self._flags_at + 4 * flag_count
+        self._edges_at = self._nodes_at + _NODE.size * self.node_count
+        self._texts_at = self._edges_at + _EDGE.size * edge_count
+        self._index_at = self._texts_at + 4 * text_count
+        self._offsets_at = self._index_at + 4 * self.node_count
+        self._blob_at = self._offsets_at + 4 * (string_count + 1)
+        self._strings = {}  # the decoded strings, by index
+        self._nodes = {}  # the decoded nodes of the loaded rooms, by index
+        # The indexes of the nodes of the loaded rooms and the rooms they lead
+        # to, least recently entered first. The rooms are loaded by the game
+        # and by the prefetching thread without a lock: every change is
+        # a single dict operation, and a node evicted meanwhile is decoded
+        # again.
+        self._rooms = OrderedDict()
+        self._prefetching = None  # the prefetch queue and the process of it
+        self._found = {}  # the indexes of the nodes found, by name
+        self.flags = tuple(self.string(self._u32(self._flags_at + 4 * i))
+                           for i in range(flag_count))
+        self._flag_bits = {flag: 1 << bit
+                           for bit, flag in enumerate(self.flags)}
+
+    def _u32(self, offset):
+        return _U32.unpack_from(self._data, offset)[0]
+
+    def string(self, index):
+        """A method returning the string with the given index. The names,
+        questions, answers and endings are kept once decoded, up to
+        cache_limit of them, they are short and compared often."""
+        strings = self._strings
+        string = strings.get(index)
+        if string is None:
+            string = self._decode(index)
+            if len(strings) >= self.cache_limit:
+                strings.clear()
+            strings[index] = string
+        return string
+
+    def _decode(self, index):
+        start, end = _SPAN.unpack_from(self._data,
+                                       self._offsets_at + 4 * index)
+        return str(self._data[self._blob_at + start:self._blob_at + end],
+                   'utf-8')
+
+    def text(self, index):
+        """A method returning the message with the given index in the list of
+        the messages of all the nodes. Messages are decoded every time, so
+        that they are never held in memory."""
+        return self._decode(
+            _U32.unpack_from(self._data, self._texts_at + 4 * index)[0])
+
+    def node(self, index):
+        """A method returning the node with the given index, loading its room
+        if it is not loaded."""
+        node = self._nodes.get(index)
+        if node is None:
+            self.load_room(self._room_of(index))
+            node = self._nodes.get(index) or self._decode_node(index)
+        return node
+
+    def _decode_node(self, index):
+        (name, room, text_start, text_count, prompt, edge_start, edge_count,
+         set_mask, ending) = _NODE.unpack_from(
+            self._data, self._nodes_at + _NODE.size * index)
+        edges = []
+        for i in range(edge_start, edge_start + edge_count):
+            choice, target, require, forbid = _EDGE.unpack_from(
+                self._data, self._edges_at + _EDGE.size * i)
+            edges.append(Edge(None if choice < 0 else self.string(choice),
+                              target, require, forbid))
+        return Node(self.string(name), self.string(room),
+                    Texts(self, text_start, text_count),
+                    None if prompt < 0 else self.string(prompt),
+                    tuple(edges), set_mask,
+                    None if ending < 0 else self.string(ending))
+
+    def _room_of(self, index):
+        """A method returning the room of a node without decoding the
+        node."""
+        return self.string(_NODE.unpack_from(
+            self._data, self._nodes_at + _NODE.size * index)[1])
+
+    def _indexes_of(self, room):
+        """A method returning the indexes of the nodes of a room: the node
+        named like the room and the ones named "<room>.<something>", which
+        lie next to each other in the index of the node names."""
+        indexes = [self.find(room)]
+        prefix = room + '.'
+        for position in range(self._lower_bound(prefix), self.node_count):
+            index = self._u32(self._index_at + 4 * position)
+            if not self._name_of(index).startswith(prefix):
+                break
+            indexes.append(index)
+        return indexes
+
+    def load_room(self, room, prefetch=False):
+        """A method decoding the nodes of a room, unless they are decoded
+        already, and marking the room as the most recently entered one. The
+        least recently entered rooms beyond room_limit are evicted. If
+        prefetch is True, the rooms the room leads to are loaded in the
+        background. Returns the names of those rooms."""
+        loaded = self._rooms.get(room)
+        if loaded is None:
+            nodes = {index: self._decode_node(index)
+                     for index in self._indexes_of(room)}
+            leads_to = {self._room_of(edge.target)
+                        for node in nodes.values() for edge in node.edges
+                        if edge.target != END}
+            leads_to.discard(room)
+            self._nodes.update(nodes)
+            loaded = self._rooms[room] = (tuple(nodes),
+                                          tuple(sorted(leads_to)))
+            while len(self._rooms) > self.room_limit:
+                try:
+                    _, (evicted, _) = self._rooms.popitem(last=False)
+                except KeyError:  # emptied by the other thread meanwhile
+                    break
+                for index in evicted:
+                    self._nodes.pop(index, None)
+        else:
+            try:
+                self._rooms.move_to_end(room)
+            except KeyError:  # evicted by the other thread meanwhile
+                pass
+        if prefetch:
+            self.prefetch(loaded[1])
+        return loaded[1]
+
+    def prefetch(self, rooms):
+        """A method loading the given rooms, unless they are loaded already,
+        in a background thread."""
+        rooms = [room for room in rooms if room not in self._rooms]
+        if not rooms:
+            return
+        if self._prefetching is None or self._prefetching[1] != os.getpid():
+            # Not started yet, or this is a forked process without the thread
+            rooms_queue = queue.SimpleQueue()
+            self._prefetching = (rooms_queue, os.getpid())
+            threading.Thread(target=self._prefetch_rooms, args=(rooms_queue,),
+                             name='prefetch', daemon=True).start()
+        for room in rooms:
+            self._prefetching[0].put(room)
+
+    def _prefetch_rooms(self, rooms_queue):
+        while True:
+            room = rooms_queue.get()
+            if room not in self._rooms:
+                self.load_room(room)
+
+    def find(self, name):
+        """A method returning the index of the node with the given name.
+        Raises KeyError if there is no such node."""
+        found = self._found
+        index = found.get(name)
+        if index is None:
+            index = self._search(name)
+            if len(found) >= self.cache_limit:
+                found.clear()
+            found[name] = index
+        return index
+
+    def _search(self, name):
+        """A method looking for a node by a binary search of the index of the
+        node names."""
+        position = self._lower_bound(name)
+        if position < self.node_count:
+            index = self._u32(self._index_at + 4 * position)
+            if self._name_of(index) == name:
+                return index
+        raise KeyError(name)
+
+    def _lower_bound(self, name):
+        """A method returning the first position in the index of the node
+        names whose name is not less than the given one."""
+        low, high = 0, self.node_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_of(self._u32(self._index_at + 4 * middle)) < name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _name_of(self, index):
+        """A method returning the name of a node without decoding the
+        node."""
+        return self.string(_NODE.unpack_from(
+            self._data, self._nodes_at + _NODE.size * index)[0])
+
+    def flag_bit(self, flag):
+        """A method returning the bit of the given flag in the bitfields, 0 if
+        the story does not use the flag."""
+        return self._flag_bits.get(flag, 0)
+
+
+def compiled_path(path):
+    """A function returning the path of the compiled form of a story."""
+    return os.path.splitext(path)[0] + '.bin'
+
+
+def load_story(path):
+    """A function loading a story. The text form of a story is compiled first
+    if its compiled form is missing, older than the text or compiled by
+    another version of this module."""
+    if path.endswith('.bin'):
+        return Story(path)
+    target = compiled_path(path)
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(path):
+            return Story(target)
+    except (OSError, StoryError):
+        pass
+    with open(path, encoding='utf-8') as file:
+        data = compile_story(file.read())
+    try:
+        _write_atomically(target, data)
+    except OSError:  # e.g. a read-only installation
+        target = os.path.join(tempfile.gettempdir(), os.path.basename(target))
+        _write_atomically(target, data)
+    return Story(target)
+
+
+def _write_atomically(path, data):
+    """A function writing a file so that readers never see it half-written."""
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile a story.')
+    parser.add_argument('source', help='the text form of the story')
+    parser.add_argument('-o', '--output', help='the compiled story, next to '
+                                               'the source by default')
+    args = parser.parse_args()
+    with open(args.source, encoding='utf-8') as source:
+        compiled = compile_story(source.read())
+    _write_atomically(args.output or compiled_path(args.source), compiled)
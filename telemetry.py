@@ -0,0 +1,194 @@
+"""Telemetry of the games: how long the Players stay in each room, how long
+they take to answer each question, what they answer and how their games end.
+
+The hooks are installed by wrapping Room.enter, Room._on_entry, Room._on_exit
+and Room.user_choice, and removed by putting the original methods back, so
+when telemetry is off the game runs exactly the same code as without it.
+Events go into a ring buffer allocated up front and are exported
+periodically, as JSON lines, by a background thread.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from story import DEFAULT_ENDING
+
+FIELDS = ('time', 'event', 'subject', 'value', 'seconds')
+
+
+class Telemetry:
+    """A class recording the events of the games into a ring buffer and
+    exporting them.
+
+    Attributes:
+    -------------
+    room_class : type
+        The Room class of the game the hooks are installed into
+    path : str
+        The JSON lines file the events are appended to, None to only keep
+        the metrics
+    capacity : int
+        The number of events the ring buffer holds, a power of two
+    interval : float
+        The number of seconds between exports
+    dropped : int
+        The number of events overwritten before they were exported
+
+    Methods:
+    -------------
+    record(event, subject, value, seconds)
+    install()
+    uninstall()
+    start()
+    stop()
+    export()
+    metrics()
+    """
+
+    def __init__(self, room_class, path=None, capacity=1 << 16,
+                 interval=10.0):
+        if capacity & (capacity - 1):
+            raise ValueError('capacity must be a power of two')
+        self.room_class = room_class
+        self.path = path
+        self.capacity = capacity
+        self.interval = interval
+        self.dropped = 0
+        self._events = [None] * capacity
+        self._count = 0
+        self._exported = 0
+        self._originals = {}
+        self._thread = None
+        self._stopping = threading.Event()
+        self._export_lock = threading.Lock()
+        self._durations = defaultdict(lambda: [0, 0.0])
+        self._answers = Counter()
+        self._endings = Counter()
+
+    def record(self, event, subject, value=None, seconds=None):
+        """A method putting an event into the ring buffer."""
+        self._events[self._count & (self.capacity - 1)] = (
+            time.time(), event, subject, value, seconds)
+        self._count += 1
+
+    def install(self):
+        """A method installing the hooks into Room."""
+        if self._originals:
+            return
+        Room = self.room_class
+        record = self.record
+        clock = time.perf_counter
+        enter = Room.enter
+        on_entry = Room._on_entry
+        on_exit = Room._on_exit
+        user_choice = Room.__dict__['user_choice'].__func__
+
+        def timed_enter(room, player):
+            start = clock()
+            next_room = enter(room, player)
+            record('dwell', room._room_name, seconds=clock() - start)
+            if next_room is None:
+                record('ending', player.ending or DEFAULT_ENDING)
+            return next_room
+
+        def timed_on_entry(room, player):
+            start = clock()
+            next_room = on_entry(room, player)
+            record('story', room._room_name, seconds=clock() - start)
+            return next_room
+
+        def timed_on_exit(room, player):
+            start = clock()
+            on_exit(room, player)
+            record('exit', room._room_name, seconds=clock() - start)
+
+        def timed_user_choice(prompt, choices, player=None):
+            start = clock()
+            choice = user_choice(prompt, choices, player)
+            record('choice', prompt, choice, clock() - start)
+            return choice
+
+        self._originals = {'enter': enter, '_on_entry': on_entry,
+                           '_on_exit': on_exit,
+                           'user_choice': Room.__dict__['user_choice']}
+        Room.enter = timed_enter
+        Room._on_entry = timed_on_entry
+        Room._on_exit = timed_on_exit
+        Room.user_choice = staticmethod(timed_user_choice)
+
+    def uninstall(self):
+        """A method putting the original methods of Room back."""
+        for name, method in self._originals.items():
+            setattr(self.room_class, name, method)
+        self._originals = {}
+
+    def start(self):
+        """A method installing the hooks and starting the periodic export."""
+        self.install()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._export_periodically,
+                                        name='telemetry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """A method removing the hooks, stopping the periodic export and
+        exporting the remaining events."""
+        self.uninstall()
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def _export_periodically(self):
+        while not self._stopping.wait(self.interval):
+            self.export()
+
+    def export(self):
+        """A method taking the events recorded since the last export out of
+        the ring buffer, adding them to the metrics and appending them to the
+        file. Returns the number of events exported."""
+        with self._export_lock:
+            count = self._count
+            first = max(self._exported, count - self.capacity)
+            self.dropped += first - self._exported
+            events = [self._events[i & (self.capacity - 1)]
+                      for i in range(first, count)]
+            self._exported = count
+            for _, event, subject, value, seconds in events:
+                if seconds is not None:
+                    totals = self._durations[event, subject]
+                    totals[0] += 1
+                    totals[1] += seconds
+                if event == 'choice':
+                    self._answers[subject, value] += 1
+                elif event == 'ending':
+                    self._endings[subject] += 1
+            if self.path and events:
+                with open(self.path, 'a') as file:
+                    file.writelines(json.dumps(dict(zip(FIELDS, event)))
+                                    + '\n' for event in events)
+                with open(self._metrics_path(), 'w') as file:
+                    json.dump(self.metrics(), file, indent=2)
+            return len(events)
+
+    def _metrics_path(self):
+        return os.path.splitext(self.path)[0] + '.metrics.json'
+
+    def metrics(self):
+        """A method returning the metrics of the exported events: the average
+        number of seconds of each kind of event (dwell time in each room,
+        answer time of each question, ...), the answers given to each
+        question and the endings reached."""
+        averages = defaultdict(dict)
+        for (event, subject), (count, seconds) in self._durations.items():
+            averages[event][subject] = {'count': count,
+                                        'average': seconds / count}
+        answers = defaultdict(dict)
+        for (prompt, choice), count in self._answers.items():
+            answers[prompt][choice] = count
+        return {'seconds': dict(averages), 'answers': dict(answers),
+                'endings': dict(self._endings), 'dropped': self.dropped}
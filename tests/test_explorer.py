@@ -0,0 +1,57 @@
+"""Tests of the explorer of the story's states."""
+
+import adventure_game
+from explorer import Explorer
+from hints import HintIndex
+from story import DEFAULT_ENDING, load_story
+
+EPILOGUE = '''== DarkRoom
+It is dark.
+@prompt Win (1) or lose (2)?
+@choice 1 -> DarkRoom.win
+@choice 2 -> DarkRoom.lose
+
+== DarkRoom.win
+You win.
+@ending HAPPY END
+@goto DarkRoom.epilogue
+
+== DarkRoom.lose
+You lose.
+
+== DarkRoom.epilogue
+The end.
+'''
+
+
+def test_an_ending_carries_on_to_the_epilogue(tmp_path):
+    path = tmp_path / 'story.txt'
+    path.write_text(EPILOGUE)
+    explorer = Explorer(load_story(str(path)))
+    assert explorer.path_counts() == {'HAPPY END': 1, 'BAD END': 1}
+    assert sorted(explorer.paths()) == [(('1',), 'HAPPY END'),
+                                        (('2',), 'BAD END')]
+    assert HintIndex(explorer).lookup(0, 0).choice == '1'
+
+
+GUARDED = '''== DarkRoom
+It is dark.
+@prompt Open the door (1)?
+@choice 1 -> DarkRoom.open if has_key
+
+== DarkRoom.open
+The door opens.
+'''
+
+
+def test_a_question_without_any_available_answer_ends_the_game(tmp_path):
+    path = tmp_path / 'story.txt'
+    path.write_text(GUARDED)
+    adventure_game.use_story(str(path))
+    try:
+        result = adventure_game.simulate([])
+        explorer = Explorer(adventure_game.story)
+    finally:
+        adventure_game.use_story(adventure_game.STORY_PATH)
+    assert result.ending == DEFAULT_ENDING
+    assert explorer.path_counts() == {DEFAULT_ENDING: 1}
@@ -0,0 +1,34 @@
+"""Tests of the log of the Players' saved games."""
+
+import adventure_game
+from adventure_game import DarkRoom, Player
+from saves import SaveLog
+
+
+def playing(name, cursor=0):
+    player = Player(DarkRoom, name)
+    player.position = (adventure_game.story.find('DarkRoom'), cursor)
+    return player
+
+
+def test_get_sees_the_saves_made_since_the_log_was_opened(tmp_path):
+    path = str(tmp_path / 'saves')
+    log, other = (SaveLog(path, adventure_game.story),
+                  SaveLog(path, adventure_game.story))
+    try:
+        log.save(playing('Ann', 1))
+        assert log.get('Ann').cursor == 1
+        other.save(playing('Ann', 2))  # e.g. by another worker
+        other.save(playing('x' * 300, 3))
+        assert log.get('Ann').cursor == 2
+        assert log.get('x' * 300).cursor == 3
+        finished = playing('Ann')
+        finished.position = None
+        log.save(finished)
+        assert log.get('Ann') is None
+        other.compact()
+        assert log.get('x' * 300).cursor == 3
+        assert log.load() == {'x' * 255: log.get('x' * 300)}
+    finally:
+        log.close()
+        other.close()
@@ -0,0 +1,59 @@
+"""Tests of the session table shared by the workers of a server."""
+
+import time
+
+import pytest
+
+import adventure_game
+from adventure_game import DarkRoom, Player
+from sessions import _SEQUENCE, SessionTable, _digest
+
+
+@pytest.fixture
+def table(tmp_path):
+    table = SessionTable(str(tmp_path / 'sessions'), adventure_game.story,
+                         rows=4)
+    yield table
+    table.close()
+
+
+def playing(name, cursor=0):
+    player = Player(DarkRoom, name)
+    player.position = (adventure_game.story.find('DarkRoom'), cursor)
+    return player
+
+
+def test_save_after_a_writer_died_mid_write(table):
+    player = playing('Ann', 1)
+    table.save(player)
+    row, _, _ = table._find(_digest('Ann'))
+    offset = table._offset(row)
+    # A writer dying after marking the row leaves its sequence odd
+    sequence = _SEQUENCE.unpack_from(table._map, offset)[0]
+    _SEQUENCE.pack_into(table._map, offset, sequence + 1)
+    player.flags = 5
+    table.save(player)
+    assert _SEQUENCE.unpack_from(table._map, offset)[0] % 2 == 0
+    snapshot = table.get('Ann')
+    assert snapshot.flags == 5
+    assert snapshot.cursor == 1
+
+
+def test_the_game_saved_the_longest_ago_gives_its_row_up(table,
+                                                         monkeypatch):
+    for number in range(6):
+        monkeypatch.setattr(time, 'time', lambda: 1000.0 + number)
+        table.save(playing(f'Player {number}'))
+    assert table.get('Player 0') is None
+    assert table.get('Player 1') is None
+    for number in range(2, 6):
+        assert table.get(f'Player {number}').name == f'Player {number}'
+
+
+def test_long_keys_are_kept_apart(table):
+    first, second = 'é' * 40 + 'first', 'é' * 40 + 'second'
+    table.save(playing(first, 1))
+    table.save(playing(second, 2))
+    assert table.get(first).cursor == 1
+    assert table.get(second).cursor == 2
+    assert table.get(first).name == 'é' * 26  # cut on a character boundary
@@ -0,0 +1,29 @@
+"""Tests of the sinks printing the narrative text."""
+
+import io
+
+from adventure_game import TextCache, TypewriterSink
+
+TEXT = ('You stand up and look around. There are two doors - the left and '
+        'the right one. Which one should I choose? ' * 3)
+
+
+def test_an_interrupted_message_is_not_rewrapped_by_a_resize():
+    cache = TextCache(width=20)
+    stream = io.StringIO()
+    sink = TypewriterSink(chars_per_second=1000, stream=stream, cache=cache)
+    expected = cache.render(TEXT, '\n').decode('utf-8')
+    frames = 0
+
+    def interrupted(seconds):
+        nonlocal frames
+        frames += 1
+        if frames < 3:
+            return False
+        cache._fixed_width = 50  # the terminal is resized (SIGWINCH)
+        cache.invalidate()
+        return True
+
+    sink.write(TEXT, '\n', interrupted)
+    assert frames == 3
+    assert stream.getvalue() == expected
@@ -0,0 +1,27 @@
+"""A smoke test of the telemetry hooks around a whole simulated game."""
+
+import json
+
+from adventure_game import Room, simulate
+from telemetry import Telemetry
+
+HAPPY_PATH = ['2', 'no', 'yes', '1', 'yes', '2']
+
+
+def test_telemetry_records_a_game(tmp_path):
+    path = tmp_path / 'game.jsonl'
+    user_choice = Room.__dict__['user_choice']
+    telemetry = Telemetry(Room, str(path))
+    telemetry.start()
+    try:
+        player = simulate(HAPPY_PATH)
+    finally:
+        telemetry.stop()
+    assert player.ending == 'HAPPY END'
+    assert Room.__dict__['user_choice'] is user_choice  # hooks removed
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [event['value'] for event in events
+            if event['event'] == 'choice'] == HAPPY_PATH
+    metrics = telemetry.metrics()
+    assert metrics['endings'] == {'HAPPY END': 1}
+    assert metrics['dropped'] == 0